@@ -1,7 +1,7 @@
 import asyncio
 from logging.config import fileConfig
 
-from sqlalchemy import pool
+from sqlalchemy import func, pool, select, text
 from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 
@@ -9,6 +9,7 @@ from alembic import context
 
 # Import all models so they are known to SQLAlchemy, they are not used though
 from app.auth.models import APIKey, Provider, User  # noqa: F401
+from app.common.migrations import MIGRATION_LOCK_ID
 from app.common.models import Base
 from app.settings import settings
 
@@ -53,6 +54,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        render_as_batch=url.startswith("sqlite"),
     )
 
     with context.begin_transaction():
@@ -60,10 +62,39 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    is_postgres = connection.dialect.name == "postgresql"
+    if is_postgres:
+        # Serialize migration runners, e.g. several containers starting at once.
+        # Taken before lock_timeout is set so the other runners wait for it.
+        connection.execute(select(func.pg_advisory_lock(MIGRATION_LOCK_ID)))
+        # Session level settings, they outlive the per migration transactions
+        connection.execute(
+            text(f"SET lock_timeout = {settings.MIGRATION_LOCK_TIMEOUT * 1000}")
+        )
+        connection.execute(
+            text(
+                f"SET statement_timeout = {settings.MIGRATION_STATEMENT_TIMEOUT * 1000}"
+            )
+        )
+        connection.commit()
 
-    with context.begin_transaction():
-        context.run_migrations()
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # Keep each migration's locks short and a failure from undoing the rest
+        transaction_per_migration=True,
+        # SQLite can not alter most of a table, batch mode recreates it instead
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+
+    try:
+        with context.begin_transaction():
+            context.run_migrations()
+    finally:
+        if is_postgres:
+            connection.rollback()
+            connection.execute(select(func.pg_advisory_unlock(MIGRATION_LOCK_ID)))
+            connection.commit()
 
 
 async def run_async_migrations() -> None:
@@ -94,4 +125,3 @@ if context.is_offline_mode():
     run_migrations_offline()
 else:
     run_migrations_online()
-    run_migrations_online()
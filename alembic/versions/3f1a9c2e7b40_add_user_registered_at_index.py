@@ -0,0 +1,29 @@
+"""add user registered_at index
+
+Revision ID: 3f1a9c2e7b40
+Revises: c979b19d4cc1
+Create Date: 2026-10-18 10:12:41.208315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.common.migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1a9c2e7b40'
+down_revision: Union[str, None] = 'c979b19d4cc1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keeps the user table writable while the index builds
+    create_index_concurrently('ix_user_registered_at_id', 'user', ['registered_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_user_registered_at_id', table_name='user')
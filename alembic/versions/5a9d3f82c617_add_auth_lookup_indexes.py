@@ -0,0 +1,39 @@
+"""add auth lookup indexes
+
+Revision ID: 5a9d3f82c617
+Revises: e41f0a7c3d58
+Create Date: 2026-10-18 14:18:36.112950
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.common.migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a9d3f82c617'
+down_revision: Union[str, None] = 'e41f0a7c3d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# provider.user_id is already covered by the unique (user_id, name) constraint
+# and user.registered_at by ix_user_registered_at_id
+
+
+def upgrade() -> None:
+    # Keeps the tables writable while the indexes build
+    create_index_concurrently('ix_password_reset_user_id', 'password_reset', ['user_id'], unique=False)
+    create_index_concurrently('ix_invitation_email', 'invitation', ['email'], unique=False)
+    create_index_concurrently('ix_api_key_user_id', 'api_key', ['user_id'], unique=False)
+    create_index_concurrently('ix_user_is_admin', 'user', ['is_admin'], unique=False, postgresql_where=sa.text('is_admin'), sqlite_where=sa.text('is_admin'))
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_user_is_admin', table_name='user')
+    drop_index_concurrently('ix_api_key_user_id', table_name='api_key')
+    drop_index_concurrently('ix_invitation_email', table_name='invitation')
+    drop_index_concurrently('ix_password_reset_user_id', table_name='password_reset')
@@ -0,0 +1,40 @@
+"""add user search trigram indexes
+
+Revision ID: 8d2e4b6a1c93
+Revises: 3f1a9c2e7b40
+Create Date: 2026-10-18 11:03:27.845102
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.common.migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e4b6a1c93'
+down_revision: Union[str, None] = '3f1a9c2e7b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Trigram indexes are Postgres only, SQLite searches without an index
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Keeps the tables writable while the indexes build
+    create_index_concurrently('ix_user_email_trgm', 'user', ['email'], unique=False, postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'})
+    create_index_concurrently('ix_user_display_name_trgm', 'user', ['display_name'], unique=False, postgresql_using='gin', postgresql_ops={'display_name': 'gin_trgm_ops'})
+    create_index_concurrently('ix_provider_email_trgm', 'provider', ['email'], unique=False, postgresql_using='gin', postgresql_ops={'email': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    drop_index_concurrently('ix_provider_email_trgm', table_name='provider')
+    drop_index_concurrently('ix_user_display_name_trgm', table_name='user')
+    drop_index_concurrently('ix_user_email_trgm', table_name='user')
+    # pg_trgm is left installed, other objects may depend on it
@@ -0,0 +1,53 @@
+"""add admin stats view
+
+Revision ID: b7c5e1d9a402
+Revises: 8d2e4b6a1c93
+Create Date: 2026-10-18 12:26:09.517734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c5e1d9a402'
+down_revision: Union[str, None] = '8d2e4b6a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+STATS_QUERY = '''
+    SELECT
+        1 AS id,
+        (SELECT count(*) FROM "user") AS users,
+        (SELECT count(*) FROM "user" WHERE is_admin) AS admins,
+        (SELECT count(*) FROM "user" WHERE is_banned) AS banned_users,
+        (SELECT count(*) FROM provider WHERE is_verified) AS verified_providers,
+        (SELECT count(*) FROM provider WHERE NOT is_verified) AS unverified_providers,
+        (SELECT count(*) FROM api_key WHERE is_active) AS active_api_keys,
+        (SELECT count(*) FROM invitation
+            WHERE used_at IS NULL AND expires_at > {now}) AS pending_invitations,
+        (SELECT count(*) FROM password_reset
+            WHERE used_at IS NULL AND expires_at > {now}) AS outstanding_password_resets,
+        {now} AS refreshed_at
+'''
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        # SQLite has no materialized views, a plain view is cheap at its scale.
+        # Dates are stored as UTC text so they compare as strings.
+        op.execute('CREATE VIEW admin_stats AS ' + STATS_QUERY.format(now="strftime('%Y-%m-%d %H:%M:%f', 'now')"))
+        return
+    op.execute('CREATE MATERIALIZED VIEW admin_stats AS ' + STATS_QUERY.format(now='now()'))
+    # REFRESH ... CONCURRENTLY requires a unique index on the view
+    op.create_index('ix_admin_stats_id', 'admin_stats', ['id'], unique=True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        op.execute('DROP VIEW admin_stats')
+        return
+    op.execute('DROP MATERIALIZED VIEW admin_stats')
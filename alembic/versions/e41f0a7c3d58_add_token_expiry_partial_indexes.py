@@ -0,0 +1,35 @@
+"""add token expiry partial indexes
+
+Revision ID: e41f0a7c3d58
+Revises: b7c5e1d9a402
+Create Date: 2026-10-18 13:41:52.903416
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.common.migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41f0a7c3d58'
+down_revision: Union[str, None] = 'b7c5e1d9a402'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keeps the tables writable while the indexes build
+    create_index_concurrently('ix_invitation_expires_at_unused', 'invitation', ['expires_at'], unique=False, postgresql_where=sa.text('used_at IS NULL'), sqlite_where=sa.text('used_at IS NULL'))
+    create_index_concurrently('ix_invitation_used_at', 'invitation', ['used_at'], unique=False, postgresql_where=sa.text('used_at IS NOT NULL'), sqlite_where=sa.text('used_at IS NOT NULL'))
+    create_index_concurrently('ix_password_reset_expires_at_unused', 'password_reset', ['expires_at'], unique=False, postgresql_where=sa.text('used_at IS NULL'), sqlite_where=sa.text('used_at IS NULL'))
+    create_index_concurrently('ix_password_reset_used_at', 'password_reset', ['used_at'], unique=False, postgresql_where=sa.text('used_at IS NOT NULL'), sqlite_where=sa.text('used_at IS NOT NULL'))
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_password_reset_used_at', table_name='password_reset')
+    drop_index_concurrently('ix_password_reset_expires_at_unused', table_name='password_reset')
+    drop_index_concurrently('ix_invitation_used_at', table_name='invitation')
+    drop_index_concurrently('ix_invitation_expires_at_unused', table_name='invitation')
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import Depends, FastAPI, HTTPException, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
@@ -7,19 +9,52 @@ from loguru import logger
 from starlette.middleware.sessions import SessionMiddleware
 
 from app.auth import router as auth_router
-from app.auth.models import User
-from app.auth.utils import optional_current_user
+from app.auth.activity import flush_activity
+from app.auth.passwords import password_hasher
+from app.auth.principal import UserPrincipal
+from app.auth.purge import purge_expired_tokens
+from app.auth.queries import warm_up_auth_queries
+from app.auth.stats import refresh_admin_stats
+from app.auth.utils import optional_current_user, resolve_request_user
+from app.common.db import close_db
 from app.common.exceptions import AuthBannedError, UserNotVerifiedError
+from app.common.instrumentation import report_query_stats, start_query_stats
+from app.common.tasks import start_periodic_task, stop_periodic_tasks
 from app.common.templates import templates
 from app.common.utils import flash
 from app.common.views import dashboard
+from app.email.dispatcher import drain_emails
 from app.logger import init_logging
 from app.settings import settings
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up_auth_queries()
+    start_periodic_task(
+        "flush_activity", settings.ACTIVITY_FLUSH_INTERVAL, flush_activity
+    )
+    start_periodic_task(
+        "refresh_admin_stats",
+        settings.ADMIN_STATS_REFRESH_INTERVAL,
+        refresh_admin_stats,
+    )
+    start_periodic_task(
+        "purge_expired_tokens", settings.PURGE_INTERVAL, purge_expired_tokens
+    )
+    yield
+    await stop_periodic_tasks()
+    await flush_activity()
+    await drain_emails()
+    password_hasher.shutdown()
+    await close_db()
+
+
 app = FastAPI(
     title=settings.APP_NAME,
     docs_url=None,
     redoc_url=None,
+    lifespan=lifespan,
 )
 
 init_logging()  # Must be called directly after app creation and before everything else
@@ -42,7 +77,9 @@ app.include_router(dashboard.router)
 
 
 @app.get("/", name="index", include_in_schema=False)
-async def index(request: Request, user: User | None = Depends(optional_current_user)):
+async def index(
+    request: Request, user: UserPrincipal | None = Depends(optional_current_user)
+):
     return templates.TemplateResponse(request, "common/templates/index.html")
 
 
@@ -87,6 +124,21 @@ async def validation_exception_handler(request, exc):
     )
 
 
+@app.middleware("http")
+async def resolve_user_middleware(request: Request, call_next):
+    """
+    Look up the user before the route runs so the template context can use it
+    without having to do any async work while rendering.
+    """
+    if not request.url.path.startswith(("/static", "/api")):
+        try:
+            await resolve_request_user(request)
+        except Exception:
+            # Errors are raised again by the route dependencies that need the user
+            pass
+    return await call_next(request)
+
+
 @app.middleware("http")
 async def exception_handling_middleware(request: Request, call_next):
     try:
@@ -99,5 +151,22 @@ async def exception_handling_middleware(request: Request, call_next):
         )
 
 
+@app.middleware("http")
+async def query_stats_middleware(request: Request, call_next):
+    """
+    Count the queries of each request, declared after the other middlewares so
+    it wraps them and includes the user lookup.
+    """
+    stats = start_query_stats(request.url.path)
+    response = await call_next(request)
+
+    route = request.scope.get("route")
+    report_query_stats(route.path if route else request.url.path, stats)
+    if not settings.is_prod:
+        response.headers["X-DB-Query-Count"] = str(stats.count)
+        response.headers["X-DB-Query-Time"] = f"{stats.duration * 1000:.1f}ms"
+    return response
+
+
 # Add session middleware for flash messages (PUT ON LAST LINE!!!!)
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
@@ -0,0 +1,17 @@
+from app.common.write_behind import TimestampBuffer
+from app.settings import settings
+
+from .models import APIKey, Provider
+
+api_key_last_used = TimestampBuffer(
+    APIKey, "last_used", staleness=settings.ACTIVITY_STALENESS
+)
+provider_last_login = TimestampBuffer(
+    Provider, "last_login_at", staleness=settings.ACTIVITY_STALENESS
+)
+
+
+async def flush_activity() -> None:
+    """Write the buffered API key and login timestamps to the database"""
+    await api_key_last_used.flush()
+    await provider_last_login.flush()
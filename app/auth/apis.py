@@ -1,48 +1,100 @@
-from datetime import datetime, timezone
-
 from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth.models import User
-from app.common.db import get_async_session
+from app.common.db import get_async_read_session, get_async_session
 
-from .models import APIKey
+from .activity import api_key_last_used
+from .cache import (
+    APIKeyPrincipal,
+    api_key_cache,
+    invalid_api_key_cache,
+    token_digest,
+)
+from .principal import UserPrincipal
+from .queries import API_KEY_PRINCIPAL
+from .serializers import serialize_users
 
-router = APIRouter()
+# orjson encodes lists of dicts, datetimes and UUIDs natively and much faster
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
-async def get_api_key_user(
+async def get_api_key_principal(
     x_api_key: str = Header(..., alias="X-API-Key"),
     session: AsyncSession = Depends(get_async_session),
-) -> User:
-    """Get a user from an API key. Used for API key authentication."""
+) -> APIKeyPrincipal:
+    """Get the API key and its user. Used for API key authentication."""
     if not x_api_key:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="API key is required"
         )
 
-    query = select(APIKey).where(APIKey.key == x_api_key, APIKey.is_active)
-    result = await session.execute(query)
-    db_api_key = result.scalar_one_or_none()
+    cache_key = token_digest(x_api_key)
+    principal = api_key_cache.get(cache_key)
+    if principal:
+        api_key_last_used.record(principal.api_key_id)
+        return principal
+
+    if invalid_api_key_cache.get(cache_key):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key"
+        )
+
+    result = await session.execute(API_KEY_PRINCIPAL, {"key": x_api_key})
+    rows = result.all()
 
-    if not db_api_key:
+    if not rows:
+        invalid_api_key_cache.set(cache_key, True)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key"
         )
 
-    # Update last_used timestamp
-    db_api_key.last_used = datetime.now(timezone.utc)
-    await session.commit()
+    # Immutable, so the cached principal is safe to share between requests.
+    # Routes that change the user load it in their own session by id.
+    principal = APIKeyPrincipal(
+        api_key_id=rows[0].api_key_id,
+        access_level=rows[0].access_level,
+        user=UserPrincipal.from_rows(rows),
+    )
+
+    # Update last_used timestamp, written to the database in the background
+    api_key_last_used.record(principal.api_key_id)
+
+    api_key_cache.set(cache_key, principal)
+    return principal
 
-    # Get the user
-    query = select(User).where(User.id == db_api_key.user_id)
-    result = await session.execute(query)
-    user = result.scalar_one_or_none()
 
-    if not user:
+async def get_api_key_user(
+    principal: APIKeyPrincipal = Depends(get_api_key_principal),
+) -> UserPrincipal:
+    """Get a user from an API key. Used for API key authentication."""
+    if principal.user.is_banned:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
+            status_code=status.HTTP_403_FORBIDDEN, detail="User is banned"
+        )
+
+    return principal.user
+
+
+@router.get("/users")
+async def export_users(
+    user: UserPrincipal = Depends(get_api_key_user),
+    session: AsyncSession = Depends(get_async_read_session),
+) -> ORJSONResponse:
+    """Export all users. Requires an admin's API key."""
+    if not user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required"
+        )
+
+    # Only the exported columns, no ORM objects
+    result = await session.execute(
+        select(User.id, User.email, User.display_name, User.registered_at).order_by(
+            User.registered_at, User.id
         )
+    )
 
-    return user
+    # Returned directly so the rows skip FastAPI's jsonable_encoder
+    return ORJSONResponse(serialize_users(result.all()))
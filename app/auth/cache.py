@@ -0,0 +1,60 @@
+import hashlib
+import uuid
+from typing import NamedTuple
+
+from app.common.cache import TTLCache
+from app.settings import settings
+
+from .models import APIKeyAccessLevel
+from .principal import UserPrincipal
+
+
+class APIKeyPrincipal(NamedTuple):
+    api_key_id: uuid.UUID
+    access_level: APIKeyAccessLevel
+    user: UserPrincipal
+
+
+# Session token digest -> UserPrincipal
+user_cache: TTLCache[str, UserPrincipal] = TTLCache(
+    maxsize=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_CACHE_TTL
+)
+# API key digest -> APIKeyPrincipal
+api_key_cache: TTLCache[str, APIKeyPrincipal] = TTLCache(
+    maxsize=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_CACHE_TTL
+)
+# Digests of unknown or revoked API keys, so clients retrying a bad key do not
+# cost a database lookup each time
+invalid_api_key_cache: TTLCache[str, bool] = TTLCache(
+    maxsize=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_NEGATIVE_CACHE_TTL
+)
+# Only holds HAS_USERS_KEY once the first user has registered. The expiry only
+# matters if the user table is emptied outside the app.
+bootstrap_cache: TTLCache[str, bool] = TTLCache(maxsize=1, ttl=settings.AUTH_CACHE_TTL)
+HAS_USERS_KEY = "has_users"
+
+
+def token_digest(token: str) -> str:
+    """Digest used as the cache key so raw tokens are not kept in memory"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def invalidate_user(user_id: uuid.UUID) -> None:
+    """Drop every cached session and API key of a user.
+
+    Must be called after committing any change to the user or their providers.
+    """
+    user_cache.pop_where(lambda user: user.id == user_id)
+    api_key_cache.pop_where(lambda entry: entry.user.id == user_id)
+
+
+def invalidate_api_key(key: str) -> None:
+    """Drop a cached API key, called after it has been revoked"""
+    digest = token_digest(key)
+    api_key_cache.pop(digest)
+    invalid_api_key_cache.set(digest, True)
+
+
+def forget_invalid_api_key(key: str) -> None:
+    """Clear a key from the invalid key cache, called after it has been created"""
+    invalid_api_key_cache.pop(token_digest(key))
@@ -1 +1,8 @@
 LOCAL_PROVIDER = "local"
+
+# Admin users page
+ADMIN_USERS_PAGE_SIZE = 25
+ADMIN_USERS_MAX_PAGE_SIZE = 100
+ADMIN_USERS_SEARCH_MAX_LENGTH = 128
+# Trigram indexes can not serve shorter searches, which match most users anyway
+ADMIN_USERS_SEARCH_MIN_LENGTH = 3
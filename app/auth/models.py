@@ -12,11 +12,35 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 
 from app.auth.serializers import UserSerializer
 from app.common.exceptions import ValidationError
-from app.common.models import Base
+from app.common.models import Base, TZDateTime
 
 
 class User(Base):
     __tablename__ = "user"
+    __table_args__ = (
+        # Keyset pagination of the admin users page walks this index
+        sa.Index("ix_user_registered_at_id", "registered_at", "id"),
+        # Admins are few, a partial index keeps counting them cheap
+        sa.Index(
+            "ix_user_is_admin",
+            "is_admin",
+            postgresql_where=sa.text("is_admin"),
+            sqlite_where=sa.text("is_admin"),
+        ),
+        # Trigram indexes for substring search in the admin console (needs pg_trgm)
+        sa.Index(
+            "ix_user_email_trgm",
+            "email",
+            postgresql_using="gin",
+            postgresql_ops={"email": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        sa.Index(
+            "ix_user_display_name_trgm",
+            "display_name",
+            postgresql_using="gin",
+            postgresql_ops={"display_name": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         sa.UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -25,7 +49,7 @@ class User(Base):
     password: Mapped[str] = mapped_column(sa.String, nullable=True)
     display_name: Mapped[str] = mapped_column(sa.String(32), nullable=False)
     registered_at: Mapped[datetime] = mapped_column(
-        sa.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+        TZDateTime, default=lambda: datetime.now(timezone.utc)
     )
     pending_email: Mapped[str] = mapped_column(sa.String, nullable=True)
 
@@ -86,6 +110,12 @@ class Provider(Base):
     __table_args__ = (
         sa.UniqueConstraint("user_id", "name", name="unique_user_provider"),
         sa.UniqueConstraint("email", "name", name="unique_email_provider"),
+        sa.Index(
+            "ix_provider_email_trgm",
+            "email",
+            postgresql_using="gin",
+            postgresql_ops={"email": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
     )
 
     id: Mapped[uuid.UUID] = mapped_column(
@@ -94,11 +124,9 @@ class Provider(Base):
     name: Mapped[str] = mapped_column(sa.String, nullable=False)
     email: Mapped[str] = mapped_column(sa.String, nullable=False)
     added_at: Mapped[datetime] = mapped_column(
-        sa.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
-    )
-    last_login_at: Mapped[datetime] = mapped_column(
-        sa.DateTime(timezone=True), nullable=True
+        TZDateTime, default=lambda: datetime.now(timezone.utc)
     )
+    last_login_at: Mapped[datetime] = mapped_column(TZDateTime, nullable=True)
     is_verified: Mapped[bool] = mapped_column(sa.Boolean, nullable=False, default=False)
     user_id: Mapped[uuid.UUID] = mapped_column(
         sa.UUID(as_uuid=True),
@@ -127,21 +155,36 @@ class APIKeyAccessLevel(str, Enum):
 
 class Invitation(Base):
     __tablename__ = "invitation"
+    __table_args__ = (
+        # Serve the active lookups and the purge of expired and used rows
+        sa.Index(
+            "ix_invitation_expires_at_unused",
+            "expires_at",
+            postgresql_where=sa.text("used_at IS NULL"),
+            sqlite_where=sa.text("used_at IS NULL"),
+        ),
+        sa.Index(
+            "ix_invitation_used_at",
+            "used_at",
+            postgresql_where=sa.text("used_at IS NOT NULL"),
+            sqlite_where=sa.text("used_at IS NOT NULL"),
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         sa.UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
-    email: Mapped[str] = mapped_column(sa.String, nullable=False)
+    email: Mapped[str] = mapped_column(sa.String, nullable=False, index=True)
     token: Mapped[str] = mapped_column(
         sa.String, nullable=False, unique=True, default=lambda: token_urlsafe(32)
     )
     created_at: Mapped[datetime] = mapped_column(
-        sa.DateTime(timezone=True),
+        TZDateTime,
         default=lambda: datetime.now(timezone.utc),
         nullable=False,
     )
     expires_at: Mapped[datetime] = mapped_column(
-        sa.DateTime(timezone=True),
+        TZDateTime,
         default=lambda: datetime.now(timezone.utc) + timedelta(days=7),
         nullable=False,
     )
@@ -150,7 +193,7 @@ class Invitation(Base):
         sa.ForeignKey("user.id", ondelete="SET NULL"),
         nullable=True,
     )
-    used_at: Mapped[datetime] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+    used_at: Mapped[datetime] = mapped_column(TZDateTime, nullable=True)
     email_sent: Mapped[bool] = mapped_column(sa.Boolean, default=False, nullable=False)
 
     @validates("email")
@@ -179,6 +222,21 @@ class Invitation(Base):
 
 class PasswordReset(Base):
     __tablename__ = "password_reset"
+    __table_args__ = (
+        # Serve the active lookups and the purge of expired and used rows
+        sa.Index(
+            "ix_password_reset_expires_at_unused",
+            "expires_at",
+            postgresql_where=sa.text("used_at IS NULL"),
+            sqlite_where=sa.text("used_at IS NULL"),
+        ),
+        sa.Index(
+            "ix_password_reset_used_at",
+            "used_at",
+            postgresql_where=sa.text("used_at IS NOT NULL"),
+            sqlite_where=sa.text("used_at IS NOT NULL"),
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         sa.UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -190,18 +248,19 @@ class PasswordReset(Base):
         sa.UUID(as_uuid=True),
         sa.ForeignKey("user.id", ondelete="CASCADE"),
         nullable=False,
+        index=True,
     )
     created_at: Mapped[datetime] = mapped_column(
-        sa.DateTime(timezone=True),
+        TZDateTime,
         default=lambda: datetime.now(timezone.utc),
         nullable=False,
     )
     expires_at: Mapped[datetime] = mapped_column(
-        sa.DateTime(timezone=True),
+        TZDateTime,
         nullable=False,
     )
     used_at: Mapped[datetime] = mapped_column(
-        sa.DateTime(timezone=True),
+        TZDateTime,
         nullable=True,
     )
 
@@ -223,13 +282,11 @@ class APIKey(Base):
     key: Mapped[str] = mapped_column(sa.String, unique=True, index=True, nullable=False)
     name: Mapped[str] = mapped_column(sa.String(32), nullable=False)
     created_at: Mapped[datetime] = mapped_column(
-        sa.DateTime(timezone=True),
+        TZDateTime,
         default=lambda: datetime.now(timezone.utc),
         nullable=False,
     )
-    last_used: Mapped[datetime] = mapped_column(
-        sa.DateTime(timezone=True), nullable=True
-    )
+    last_used: Mapped[datetime] = mapped_column(TZDateTime, nullable=True)
     is_active: Mapped[bool] = mapped_column(sa.Boolean, default=True, nullable=False)
     access_level: Mapped[APIKeyAccessLevel] = mapped_column(
         SQLEnum(APIKeyAccessLevel), default=APIKeyAccessLevel.READ, nullable=False
@@ -240,6 +297,7 @@ class APIKey(Base):
         sa.UUID(as_uuid=True),
         sa.ForeignKey("user.id", ondelete="CASCADE"),
         nullable=False,
+        index=True,
     )
     user: Mapped["app.models.User"] = relationship(  # noqa: F821 # type: ignore
         "User",
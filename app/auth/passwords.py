@@ -0,0 +1,69 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from passlib.context import CryptContext
+
+from app.common.exceptions import ServiceBusyError
+from app.settings import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated thread pool so slow hashes do not block the event loop.
+
+    bcrypt releases the GIL while hashing, so the threads run in parallel with the
+    event loop. Once `max_queue` operations are waiting, new ones are rejected with
+    a `ServiceBusyError` instead of queueing up without limit.
+
+    Args:
+        max_workers: Number of hashes that can run at the same time
+        max_queue: Max operations running or waiting, 0 for no limit
+    """
+
+    def __init__(self, max_workers: int, max_queue: int = 0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_depth = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hash"
+        )
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.max_queue and self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise ServiceBusyError("Too many requests, please try again shortly")
+
+        self.queue_depth += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+        finally:
+            self.queue_depth -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
@@ -0,0 +1,62 @@
+"""
+Read only snapshot of the signed in user, used on the request path instead of
+the ORM `User`. Building it sets up no identity map or attribute
+instrumentation, and it is safe to share between requests from the cache.
+
+Views that change the user load the ORM object in their own session by id.
+"""
+
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import Row
+
+
+@dataclass(frozen=True, slots=True)
+class ProviderPrincipal:
+    name: str
+    email: str
+    is_verified: bool
+    added_at: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class UserPrincipal:
+    id: uuid.UUID
+    email: str
+    display_name: str
+    registered_at: datetime
+    pending_email: Optional[str]
+    is_admin: bool
+    is_banned: bool
+    providers: Tuple[ProviderPrincipal, ...]
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Row]) -> Optional["UserPrincipal"]:
+        """Build from the rows of `USER_PRINCIPAL`, there is one per provider"""
+        if not rows:
+            return None
+
+        user = rows[0]
+        providers = tuple(
+            ProviderPrincipal(
+                name=row.provider_name,
+                email=row.provider_email,
+                is_verified=row.provider_is_verified,
+                added_at=row.provider_added_at,
+            )
+            for row in rows
+            if row.provider_name is not None
+        )
+        return cls(
+            id=user.id,
+            email=user.email,
+            display_name=user.display_name,
+            registered_at=user.registered_at,
+            pending_email=user.pending_email,
+            is_admin=user.is_admin,
+            is_banned=user.is_banned,
+            providers=providers,
+        )
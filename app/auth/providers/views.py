@@ -24,6 +24,7 @@ from ..utils import (
     authenticate_user,
     create_token,
     get_user,
+    has_users,
     optional_current_user,
 )
 from .generic_oidc import sso as generic_oidc_sso
@@ -117,9 +118,7 @@ async def sso_callback(
 
         if not found_user:
             # Check if this would be the first user
-            query = select(User)
-            result = await session.execute(query)
-            is_first_user = result.first() is None
+            is_first_user = not await has_users(session)
 
             # Block SSO registration if disabled (except for first user or valid invitation)
             if not current_user and settings.DISABLE_REGISTRATION and not is_first_user:
@@ -165,13 +164,18 @@ async def sso_callback(
                         status_code=status.HTTP_303_SEE_OTHER,
                     )
 
+            # Connecting a provider changes the user, which needs the ORM object
+            existing_user = None
+            if current_user:
+                existing_user = await session.get(User, current_user.id)
+
             user_stored = await add_user(
                 session,
                 UserSignUpSerializer(email=email),
                 sso_user.provider,
                 sso_user.display_name,
                 is_verified=provider.is_trused_provider,
-                existing_user=current_user,
+                existing_user=existing_user,
             )
             if (
                 not user_stored.is_admin
@@ -0,0 +1,57 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Type
+
+import sqlalchemy as sa
+from loguru import logger
+
+from app.common.db import async_engine
+from app.common.models import Base, row_batch_condition
+from app.settings import settings
+
+from .models import Invitation, PasswordReset
+
+
+async def _delete_in_batches(model: Type[Base], condition, batch_size: int) -> int:
+    """Delete the rows of `model` matching `condition`, `batch_size` at a time.
+
+    Each batch is its own short transaction so the purge never holds locks on
+    a large part of the table. The batch is found through the partial index
+    that serves `condition` and deleted by physical row id.
+    """
+    table = model.__table__
+    statement = sa.delete(table).where(
+        row_batch_condition(table, condition, batch_size, async_engine.dialect.name)
+    )
+
+    deleted = 0
+    while True:
+        async with async_engine.begin() as connection:
+            result = await connection.execute(statement)
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+        # Let requests waiting on the pool in between batches
+        await asyncio.sleep(0)
+
+
+async def purge_expired_tokens() -> None:
+    """Delete expired or used invitations and password resets"""
+    now = datetime.now(timezone.utc)
+    used_before = now - timedelta(seconds=settings.PURGE_USED_AFTER)
+
+    for model in (Invitation, PasswordReset):
+        expired = await _delete_in_batches(
+            model,
+            sa.and_(model.used_at.is_(None), model.expires_at < now),
+            settings.PURGE_BATCH_SIZE,
+        )
+        used = await _delete_in_batches(
+            model,
+            sa.and_(model.used_at.is_not(None), model.used_at < used_before),
+            settings.PURGE_BATCH_SIZE,
+        )
+        if expired or used:
+            logger.info(
+                f"Purged {expired} expired and {used} used {model.__tablename__} rows"
+            )
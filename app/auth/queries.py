@@ -0,0 +1,100 @@
+"""
+Statements on the authentication hot path. They are built once with bound
+parameters, so requests reuse the statement objects and their cache keys
+instead of rebuilding them, and the compiled SQL is the same on every call
+which lets asyncpg reuse its prepared statements.
+"""
+
+import asyncio
+import uuid
+from typing import Any, Dict, List, Tuple
+
+from loguru import logger
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql import Executable
+
+from app.common.db import async_engine, async_session_maker
+
+from .models import APIKey, Provider, User
+
+_user = User.__table__
+_provider = Provider.__table__
+_api_key = APIKey.__table__
+
+# Only the columns of a user and their providers that the request path reads,
+# one row per provider. Loaded into a `UserPrincipal`.
+_USER_PRINCIPAL_COLUMNS = (
+    _user.c.id,
+    _user.c.email,
+    _user.c.display_name,
+    _user.c.registered_at,
+    _user.c.pending_email,
+    _user.c.is_admin,
+    _user.c.is_banned,
+    _provider.c.name.label("provider_name"),
+    _provider.c.email.label("provider_email"),
+    _provider.c.is_verified.label("provider_is_verified"),
+    _provider.c.added_at.label("provider_added_at"),
+)
+
+# The session user
+USER_PRINCIPAL = (
+    select(*_USER_PRINCIPAL_COLUMNS)
+    .select_from(_user.outerjoin(_provider, _provider.c.user_id == _user.c.id))
+    .where(_user.c.id == bindparam("user_id"))
+    .order_by(_provider.c.added_at)
+)
+
+PROVIDER_WITH_USER = (
+    select(Provider)
+    .where(Provider.email == bindparam("email"), Provider.name == bindparam("name"))
+    .options(selectinload(Provider.user))
+)
+
+# An active API key and its user
+API_KEY_PRINCIPAL = (
+    select(
+        _api_key.c.id.label("api_key_id"),
+        _api_key.c.access_level,
+        *_USER_PRINCIPAL_COLUMNS,
+    )
+    .select_from(
+        _api_key.join(_user, _user.c.id == _api_key.c.user_id).outerjoin(
+            _provider, _provider.c.user_id == _user.c.id
+        )
+    )
+    .where(_api_key.c.key == bindparam("key"), _api_key.c.is_active)
+    .order_by(_provider.c.added_at)
+)
+
+# Parameters that match nothing, used to run the statements during warm up
+_WARM_UP: List[Tuple[Executable, Dict[str, Any]]] = [
+    (USER_PRINCIPAL, {"user_id": uuid.UUID(int=0)}),
+    (PROVIDER_WITH_USER, {"email": "", "name": ""}),
+    (API_KEY_PRINCIPAL, {"key": ""}),
+]
+
+
+async def _warm_up_connection(engine) -> None:
+    async with async_session_maker(bind=engine) as session:
+        for statement, params in _WARM_UP:
+            await session.execute(statement, params)
+
+
+async def warm_up_auth_queries() -> None:
+    """
+    Open the pooled connections and run the hot statements on each, so the
+    first requests after a deploy do not pay for connecting, compiling and
+    preparing them.
+
+    Only the primary is warmed up, all of these statements run on it.
+    """
+    try:
+        # Concurrent sessions so each one checks out a different connection,
+        # a pool without a size (NullPool) keeps nothing so one is enough
+        size = getattr(async_engine.sync_engine.pool, "size", lambda: 1)()
+        await asyncio.gather(*(_warm_up_connection(async_engine) for _ in range(size)))
+    except Exception:
+        # The app can still start, requests connect on demand
+        logger.exception("Failed to warm up database connections")
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 from pydantic import BaseModel, ValidationInfo, field_validator
 
@@ -28,6 +28,23 @@ class UserSerializer(BaseModel):
         return str(v)
 
 
+def serialize_users(users: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    The fields of `UserSerializer` as plain dicts for a list of users, without
+    building and validating a model per user. For list and export responses,
+    the datetimes are left to the JSON encoder.
+    """
+    return [
+        {
+            "id": str(user.id),
+            "email": user.email,
+            "display_name": user.display_name,
+            "registered_at": user.registered_at,
+        }
+        for user in users
+    ]
+
+
 class TokenDataSerializer(BaseModel):
     email: str
     # TODO: Make token_type an enum
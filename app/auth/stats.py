@@ -0,0 +1,77 @@
+from datetime import timedelta
+from typing import Optional
+
+import sqlalchemy as sa
+from loguru import logger
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.common.db import async_engine
+from app.common.models import TZDateTime
+from app.settings import settings
+
+# Kept out of Base.metadata so create_all and autogenerate leave the
+# materialized view alone, it is managed by its migration
+admin_stats = sa.Table(
+    "admin_stats",
+    sa.MetaData(),
+    sa.Column("users", sa.BigInteger),
+    sa.Column("admins", sa.BigInteger),
+    sa.Column("banned_users", sa.BigInteger),
+    sa.Column("verified_providers", sa.BigInteger),
+    sa.Column("unverified_providers", sa.BigInteger),
+    sa.Column("active_api_keys", sa.BigInteger),
+    sa.Column("pending_invitations", sa.BigInteger),
+    sa.Column("outstanding_password_resets", sa.BigInteger),
+    sa.Column("refreshed_at", TZDateTime),
+)
+
+# Arbitrary key for pg_try_advisory_lock, so only one worker refreshes at a time
+ADMIN_STATS_LOCK_ID = 0x61646D73
+
+
+async def get_admin_stats(session: AsyncSession) -> Optional[Row]:
+    """Read the precomputed admin stats, a single row regardless of table sizes"""
+    result = await session.execute(sa.select(admin_stats))
+    return result.first()
+
+
+async def refresh_admin_stats() -> None:
+    """Recompute the admin stats materialized view.
+
+    CONCURRENTLY keeps the view readable while it is rebuilt. Every worker runs
+    this task, so it is skipped when another worker holds the advisory lock or
+    has refreshed the view within the interval.
+    """
+    if async_engine.dialect.name != "postgresql":
+        # SQLite has a plain view instead, it is always up to date
+        return
+
+    async with async_engine.connect() as connection:
+        locked = await connection.scalar(
+            sa.select(sa.func.pg_try_advisory_lock(ADMIN_STATS_LOCK_ID))
+        )
+        if not locked:
+            return
+        try:
+            is_fresh = await connection.scalar(
+                sa.select(
+                    admin_stats.c.refreshed_at
+                    > sa.func.now()
+                    - timedelta(seconds=settings.ADMIN_STATS_REFRESH_INTERVAL)
+                )
+            )
+            if is_fresh:
+                return
+            await connection.execute(
+                sa.text("REFRESH MATERIALIZED VIEW CONCURRENTLY admin_stats")
+            )
+            await connection.commit()
+            logger.debug("Refreshed admin stats")
+        finally:
+            # Clears a failed refresh, session level advisory locks survive it
+            await connection.rollback()
+            await connection.execute(
+                sa.select(sa.func.pg_advisory_unlock(ADMIN_STATS_LOCK_ID))
+            )
+            await connection.commit()
@@ -1,16 +1,15 @@
 import string
+import uuid
 from datetime import datetime, timedelta, timezone
 from functools import wraps
 
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import HTTPException, Request, status
 from fastapi.security import APIKeyCookie, OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from loguru import logger
-from passlib.context import CryptContext
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import selectinload
 
 from app.common.db import async_session_maker
 from app.common.exceptions import (
@@ -23,8 +22,19 @@ from app.common.exceptions import (
 from app.email.config import is_smtp_configured
 from app.settings import settings
 
+from .activity import provider_last_login
+from .cache import (
+    HAS_USERS_KEY,
+    bootstrap_cache,
+    invalidate_user,
+    token_digest,
+    user_cache,
+)
 from .constants import LOCAL_PROVIDER
 from .models import Provider, User
+from .passwords import password_hasher
+from .principal import UserPrincipal
+from .queries import PROVIDER_WITH_USER, USER_PRINCIPAL
 from .serializers import TokenDataSerializer, UserSignUpSerializer
 
 AUTH_COOKIE = APIKeyCookie(name=settings.COOKIE_NAME, auto_error=False)
@@ -33,14 +43,14 @@ AUTH_COOKIE = APIKeyCookie(name=settings.COOKIE_NAME, auto_error=False)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
 def admin_required(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        # request = kwargs.get("request")
         user = kwargs.get("user")
+        request = kwargs.get("request")
+        if user is None and request is not None:
+            # Reuse the user already resolved for this request
+            user = getattr(request.state, "user", None)
 
         if not user or not user.is_admin:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
@@ -50,7 +60,7 @@ def admin_required(func):
 
 
 async def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return await password_hasher.verify(plain_password, hashed_password)
 
 
 async def verify_and_get_password_hash(password):
@@ -65,7 +75,7 @@ async def verify_and_get_password_hash(password):
             "Password must be at least 8 characters long and contain an uppercase, lowercase, number, and a special char",
         )
 
-    return pwd_context.hash(password)
+    return await password_hasher.hash(password)
 
 
 async def create_token(
@@ -120,12 +130,9 @@ async def authenticate_user(
         password: User's password
     """
     # Since we treat "local" as a provider, we need to check for it
-    query = (
-        select(Provider)
-        .filter(Provider.email == email, Provider.name == provider)
-        .options(selectinload(Provider.user))
+    result = await session.execute(
+        PROVIDER_WITH_USER, {"email": email, "name": provider}
     )
-    result = await session.execute(query)
     provider = result.scalar_one_or_none()
     if not provider:
         return None
@@ -153,14 +160,15 @@ async def authenticate_user(
     if user.is_banned:
         raise AuthBannedError
 
-    # User is allowed to login at this point
-    provider.last_login_at = datetime.now(timezone.utc)
-    await session.commit()
+    # User is allowed to login at this point, written to the database in the background
+    provider_last_login.record(provider.id)
 
     return user
 
 
-async def _get_user_from_session_token(session_token: str, optional: bool = False):
+async def _get_user_from_session_token(
+    session_token: str, optional: bool = False
+) -> UserPrincipal | None:
     """
     Get the current authenticated user.
     """
@@ -170,7 +178,9 @@ async def _get_user_from_session_token(session_token: str, optional: bool = Fals
                 return None
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
         token_data = await get_token_payload(session_token, "access")
-    except InvalidTokenError:
+        user_id = uuid.UUID(token_data.user_id)
+    except (InvalidTokenError, ValueError, TypeError):
+        # ValueError and TypeError for a signed token with a malformed payload
         if optional:
             return None
         raise HTTPException(
@@ -178,64 +188,115 @@ async def _get_user_from_session_token(session_token: str, optional: bool = Fals
             detail="Could not validate access token",
         )
     else:
+        cache_key = token_digest(session_token)
+        user = user_cache.get(cache_key)
+        if user:
+            return user
+
+        # Read from the primary, the result is cached and a lagging replica
+        # could cache a user that was just banned or changed
         async with async_session_maker() as session:
-            query = (
-                select(Provider)
-                .filter(
-                    Provider.email == token_data.email,
-                    Provider.user_id == token_data.user_id,
-                    Provider.name == token_data.provider_name,
-                )
-                .options(selectinload(Provider.user))
+            # The provider for this token is picked out of the loaded providers
+            result = await session.execute(USER_PRINCIPAL, {"user_id": user_id})
+            user = UserPrincipal.from_rows(result.all())
+
+        provider = None
+        if user:
+            provider = next(
+                (
+                    p
+                    for p in user.providers
+                    if p.email == token_data.email
+                    and p.name == token_data.provider_name
+                ),
+                None,
             )
-            result = await session.execute(query)
-            provider = result.scalar_one_or_none()
-            if not provider:
-                if optional:
-                    return None
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-
-            if not provider.is_verified:
-                raise UserNotVerifiedError(
-                    email=token_data.email,
-                    provider=provider.name,
-                )
 
-            # Query for user to return
-            # Needed becuase if provider.user is returned we get the error:
-            # "DetachedInstanceError: Parent instance <User at 0x7f8b3c1b3d60> is not bound to a Session; lazy load operation of attribute 'providers' cannot proceed"
-            query = (
-                select(User)
-                .filter(User.id == provider.user_id)
-                .options(selectinload(User.providers))
+        if not provider:
+            if optional:
+                return None
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+        if not provider.is_verified:
+            raise UserNotVerifiedError(
+                email=token_data.email,
+                provider=provider.name,
             )
-            result = await session.execute(query)
-            user = result.scalar_one_or_none()
-            return user
 
+        user_cache.set(cache_key, user)
+        return user
+
+
+async def resolve_request_user(request: Request) -> UserPrincipal | None:
+    """
+    Get the user for the session cookie of the request.
+
+    The lookup is only done once per request, the result is stored on
+    `request.state` and reused by every dependency and the template context.
+    Banned users are returned as is, it is up to the caller to handle them.
+
+    The user is a read only `UserPrincipal`, views that change the user must
+    load the ORM `User` in their own session.
+    """
+    if hasattr(request.state, "user"):
+        if request.state.user_error:
+            raise request.state.user_error
+        return request.state.user
+
+    session_token = await AUTH_COOKIE(request)
+    try:
+        user = await _get_user_from_session_token(session_token, optional=True)
+    except UserNotVerifiedError as e:
+        request.state.user = None
+        request.state.user_error = e
+        raise
+
+    request.state.user = user
+    request.state.user_error = None
+    return user
 
-async def current_user(session_token: str = Depends(AUTH_COOKIE)):
+
+async def current_user(request: Request) -> UserPrincipal:
     """
     Get the current authenticated user. User is required for the page.
     """
-    user = await _get_user_from_session_token(session_token, optional=False)
+    user = await resolve_request_user(request)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
     if user.is_banned:
         # This will invalidate the users current session
         raise AuthBannedError
     return user
 
 
-async def optional_current_user(session_token: str = Depends(AUTH_COOKIE)):
+async def optional_current_user(request: Request) -> UserPrincipal | None:
     """
     Used when the user object is optional for a page
     """
-    user = await _get_user_from_session_token(session_token, optional=True)
+    user = await resolve_request_user(request)
     if user and user.is_banned:
         # Since the user is optional, we can just return None
         return None
     return user
 
 
+async def has_users(session) -> bool:
+    """Check whether any user exists, used to bootstrap the first admin.
+
+    Once true the answer is cached, the last admin can not be deleted so it
+    does not flip back.
+    """
+    if bootstrap_cache.get(HAS_USERS_KEY):
+        return True
+
+    result = await session.execute(select(User.id).limit(1))
+    if result.first() is None:
+        return False
+
+    bootstrap_cache.set(HAS_USERS_KEY, True)
+    return True
+
+
 async def add_user(
     session,
     user_input: UserSignUpSerializer,
@@ -311,11 +372,10 @@ async def add_user(
                     f"This {provider_name} account is already connected to a different user"
                 )
 
-        # Check if this is the first user before creating the new one
-        count = await session.execute(select(func.count(User.id)))
-        count = count.scalar()
-
-        is_first_user = count == 1  # its 1 because of this user that was created above
+        # Check if this is the first user, at most two rows are needed to tell
+        result = await session.execute(select(User.id).limit(2))
+        # its 1 because of this user that was created above
+        is_first_user = len(result.all()) == 1
         # Set admin and verified status before committing if first user
         # Auto-verify if SMTP is not configured or if it's the first user
         provider_is_verified = is_verified or not is_smtp_configured()
@@ -332,6 +392,8 @@ async def add_user(
         session.add(provider)
 
         await session.commit()
+        if existing_user:
+            invalidate_user(existing_user.id)
     except IntegrityError:
         logger.exception("Error adding user")
         await session.rollback()
@@ -365,12 +427,9 @@ async def check_email_exists(session, email: str) -> bool:
 
 
 async def get_user(session, email: str, provider: str):
-    query = (
-        select(Provider)
-        .filter(Provider.email == email, Provider.name == provider)
-        .options(selectinload(Provider.user))
+    result = await session.execute(
+        PROVIDER_WITH_USER, {"email": email, "name": provider}
     )
-    result = await session.execute(query)
     provider = result.scalar_one_or_none()
     if provider:
         return provider.user
@@ -5,12 +5,18 @@ from fastapi import APIRouter, Depends, Form, HTTPException, Request, status
 from fastapi.responses import RedirectResponse
 from loguru import logger
 from pydantic import validate_email
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.auth.cache import (
+    forget_invalid_api_key,
+    invalidate_api_key,
+    invalidate_user,
+)
 from app.auth.constants import LOCAL_PROVIDER
 from app.auth.models import APIKey, APIKeyAccessLevel, Provider, User
+from app.auth.principal import UserPrincipal
 from app.auth.providers.views import providers as list_of_sso_providers
 from app.auth.serializers import TokenDataSerializer
 from app.auth.utils import (
@@ -18,8 +24,8 @@ from app.auth.utils import (
     current_user,
     verify_and_get_password_hash,
 )
-from app.common.db import get_async_session
-from app.common.exceptions import ValidationError
+from app.common.db import get_async_read_session, get_async_session
+from app.common.exceptions import ServiceBusyError, ValidationError
 from app.common.templates import templates
 from app.common.utils import flash
 from app.email.send import send_verification_email
@@ -48,7 +54,7 @@ async def account_settings_view(request: Request):
 )
 async def account_settings_profile_view(
     request: Request,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
 ):
     """
     Display the user's profile settings page.
@@ -69,7 +75,7 @@ async def account_settings_profile_view(
 )
 async def account_settings_providers_view(
     request: Request,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
 ):
     """
     Display the user's provider settings page.
@@ -90,8 +96,8 @@ async def account_settings_providers_view(
 )
 async def account_settings_api_keys_view(
     request: Request,
-    user: User = Depends(current_user),
-    session: AsyncSession = Depends(get_async_session),
+    user: UserPrincipal = Depends(current_user),
+    session: AsyncSession = Depends(get_async_read_session),
 ):
     """
     Display the user's API key settings page.
@@ -117,7 +123,7 @@ async def account_settings_api_keys_view(
 )
 async def account_settings_delete_view(
     request: Request,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
 ):
     """
     Display the delete account page.
@@ -136,7 +142,7 @@ async def account_settings_delete_view(
 async def update_display_name(
     request: Request,
     display_name: str = Form(...),
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """
@@ -165,6 +171,7 @@ async def update_display_name(
             status_code=status.HTTP_303_SEE_OTHER,
         )
 
+    invalidate_user(user.id)
     return RedirectResponse(
         url=request.url_for("auth.account_settings_profile"),
         status_code=status.HTTP_303_SEE_OTHER,
@@ -172,7 +179,9 @@ async def update_display_name(
 
 
 @router.get("/change-email", name="auth.change_email", summary="Change email form")
-async def change_email_view(request: Request, user: User = Depends(current_user)):
+async def change_email_view(
+    request: Request, user: UserPrincipal = Depends(current_user)
+):
     """
     Display the change email form.
     """
@@ -186,7 +195,7 @@ async def change_email_view(request: Request, user: User = Depends(current_user)
 )
 async def change_email_cancel(
     request: Request,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """
@@ -198,6 +207,7 @@ async def change_email_cancel(
     db_user = user_result.scalar_one()
     db_user.pending_email = None
     await session.commit()
+    invalidate_user(user.id)
 
     flash(request, "Email change has been cancelled", "info")
     return RedirectResponse(
@@ -212,7 +222,7 @@ async def change_email_cancel(
 async def change_email(
     request: Request,
     new_email: str = Form(...),
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """
@@ -266,6 +276,7 @@ async def change_email(
             db_user = user_result.scalar_one()
             db_user.email = new_email
             await session.commit()
+            invalidate_user(user.id)
             return RedirectResponse(
                 url=request.url_for("auth.account_settings_providers"),
                 status_code=status.HTTP_303_SEE_OTHER,
@@ -284,6 +295,7 @@ async def change_email(
     db_user = user_result.scalar_one()
     db_user.pending_email = new_email
     await session.commit()
+    invalidate_user(user.id)
 
     # Create a token for the new email
     validation_token = await create_token(
@@ -313,7 +325,9 @@ async def change_email(
     name="auth.connect_local",
     summary="Connect local provider",
 )
-async def connect_local_view(request: Request, user: User = Depends(current_user)):
+async def connect_local_view(
+    request: Request, user: UserPrincipal = Depends(current_user)
+):
     """
     Display the connect local provider page.
     """
@@ -330,7 +344,7 @@ async def connect_local_view(request: Request, user: User = Depends(current_user
 )
 async def connect_local(
     request: Request,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
     password: str = Form(...),
     confirm_password: str = Form(...),
@@ -359,9 +373,10 @@ async def connect_local(
         db_user.password = await verify_and_get_password_hash(password)
 
         await session.commit()
+        invalidate_user(user.id)
 
     except Exception as e:
-        if isinstance(e, ValidationError):
+        if isinstance(e, (ValidationError, ServiceBusyError)):
             flash(request, str(e), "error")
         else:
             logger.exception(f"Error connecting {LOCAL_PROVIDER} provider")
@@ -388,14 +403,20 @@ async def connect_local(
 async def disconnect_provider(
     provider: str,
     request: Request,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """
     Disconnect an authentication provider from the user's account.
     Ensures at least one provider remains connected.
     """
-    if len(user.providers) <= 1:
+    # Counted in this session, the cached user can be stale when another worker
+    # removed a provider, and removing the last one locks the user out. The user
+    # row is locked so two disconnects at once can not both see two providers.
+    await session.execute(select(User.id).filter(User.id == user.id).with_for_update())
+    count_query = select(func.count(Provider.id)).filter(Provider.user_id == user.id)
+    result = await session.execute(count_query)
+    if result.scalar_one() <= 1:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot disconnect your only authentication provider.",
@@ -433,6 +454,7 @@ async def disconnect_provider(
             detail="An unexpected error occurred while disconnecting provider.",
         )
 
+    invalidate_user(user.id)
     return RedirectResponse(
         url=request.url_for("auth.account_settings_providers"),
         status_code=status.HTTP_303_SEE_OTHER,
@@ -442,7 +464,7 @@ async def disconnect_provider(
 @router.post("/api-keys", name="api_key.create.post")
 async def create_api_key(
     request: Request,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
     name: str = Form(...),
     access_level: APIKeyAccessLevel = Form(...),
@@ -458,6 +480,7 @@ async def create_api_key(
         )
         session.add(db_api_key)
         await session.commit()
+        forget_invalid_api_key(api_key)
 
     except Exception as e:
         if isinstance(e, ValidationError):
@@ -484,7 +507,7 @@ async def create_api_key(
 async def revoke_api_key(
     request: Request,
     key_id: uuid.UUID,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """Revoke an API key."""
@@ -501,6 +524,7 @@ async def revoke_api_key(
     # Update the key to be inactive
     api_key.is_active = False
     await session.commit()
+    invalidate_api_key(api_key.key)
 
     return RedirectResponse(
         url=request.url_for("auth.account_settings_api_keys"),
@@ -511,7 +535,7 @@ async def revoke_api_key(
 @router.post("/delete", name="auth.delete_account.post", summary="Delete user account")
 async def delete_account(
     request: Request,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """
@@ -530,9 +554,10 @@ async def delete_account(
 
         # If user is admin, check if they are the only admin
         if user_to_delete.is_admin:
-            admin_count_query = select(User).filter(User.is_admin)
+            # Two rows are enough to tell whether another admin exists
+            admin_count_query = select(User.id).filter(User.is_admin).limit(2)
             admin_result = await session.execute(admin_count_query)
-            admin_users = admin_result.scalars().all()
+            admin_users = admin_result.all()
             if len(admin_users) <= 1:
                 flash(request, "Cannot delete the only admin account", "error")
                 return RedirectResponse(
@@ -542,6 +567,7 @@ async def delete_account(
 
         await session.delete(user_to_delete)
         await session.commit()
+        invalidate_user(user_to_delete.id)
 
         # Clear session cookie and redirect to home
         response = RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
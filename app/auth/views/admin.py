@@ -1,16 +1,36 @@
+import base64
+import re
 import uuid
 from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, Form, Request, status
 from fastapi.responses import RedirectResponse
-from sqlalchemy import select
+from sqlalchemy import or_, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.auth.constants import LOCAL_PROVIDER
-from app.auth.models import Invitation, PasswordReset, User
+from app.auth.cache import (
+    api_key_cache,
+    invalid_api_key_cache,
+    invalidate_user,
+    user_cache,
+)
+from app.auth.constants import (
+    ADMIN_USERS_MAX_PAGE_SIZE,
+    ADMIN_USERS_PAGE_SIZE,
+    ADMIN_USERS_SEARCH_MAX_LENGTH,
+    ADMIN_USERS_SEARCH_MIN_LENGTH,
+    LOCAL_PROVIDER,
+)
+from app.auth.models import Invitation, PasswordReset, Provider, User
+from app.auth.passwords import password_hasher
+from app.auth.principal import UserPrincipal
+from app.auth.providers.views import providers as list_of_sso_providers
+from app.auth.stats import get_admin_stats
 from app.auth.utils import admin_required, current_user
-from app.common.db import get_async_session
+from app.common.db import get_async_read_session, get_async_session
+from app.common.instrumentation import query_stats
 from app.common.templates import templates
 from app.common.utils import flash
 from app.email.send import (
@@ -29,7 +49,7 @@ router = APIRouter(tags=["Admin"], include_in_schema=False)
 async def admin_reset_password(
     request: Request,
     user_id: uuid.UUID,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """Generate a password reset link for a user."""
@@ -106,7 +126,7 @@ async def admin_reset_password(
 async def invite_user(
     request: Request,
     email: str = Form(...),
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """Create a new invitation."""
@@ -180,7 +200,7 @@ async def invite_user(
 async def resend_invitation(
     request: Request,
     invitation_id: uuid.UUID,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """Resend an invitation email."""
@@ -239,7 +259,7 @@ async def send_test_email(
     request: Request,
     email_type: str = Form(...),
     test_email: str = Form(...),
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """Send a test email of the specified type."""
@@ -299,21 +319,119 @@ async def admin_view(request: Request):
     )
 
 
+def _parse_bool_filter(value: Optional[str]) -> Optional[bool]:
+    """Filters come from a select where an empty value means "any" """
+    if value == "true":
+        return True
+    if value == "false":
+        return False
+    return None
+
+
+def _encode_users_cursor(target_user: User) -> str:
+    raw = f"{target_user.registered_at.isoformat()}|{target_user.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_users_cursor(cursor: str) -> Optional[Tuple[datetime, uuid.UUID]]:
+    try:
+        registered_at, user_id = base64.urlsafe_b64decode(cursor).decode().split("|")
+        return datetime.fromisoformat(registered_at), uuid.UUID(user_id)
+    except ValueError:
+        return None
+
+
+def _parse_user_filters(
+    is_admin: Optional[str],
+    is_banned: Optional[str],
+    is_verified: Optional[str],
+    provider: Optional[str],
+    q: Optional[str],
+) -> Dict[str, Any]:
+    q = (q or "").strip()[:ADMIN_USERS_SEARCH_MAX_LENGTH]
+    return {
+        "is_admin": _parse_bool_filter(is_admin),
+        "is_banned": _parse_bool_filter(is_banned),
+        "is_verified": _parse_bool_filter(is_verified),
+        "provider": provider or None,
+        "q": q if len(q) >= ADMIN_USERS_SEARCH_MIN_LENGTH else None,
+    }
+
+
+def _user_search_condition(q: str):
+    """Match users whose email, display name or provider email contains `q`
+
+    A filter on each user row, with an EXISTS for the providers, so the keyset
+    scan stops once it has found a page of matches instead of collecting and
+    deduplicating every match first.
+    """
+    pattern = "%" + re.sub(r"([\\%_])", r"\\\1", q) + "%"
+    return or_(
+        User.email.ilike(pattern, escape="\\"),
+        User.display_name.ilike(pattern, escape="\\"),
+        User.providers.any(Provider.email.ilike(pattern, escape="\\")),
+    )
+
+
+async def _query_admin_users(
+    session: AsyncSession,
+    filters: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[User], bool]:
+    """Load a page of users for the admin console, returns it and whether more follow"""
+    # Keyset pagination on (registered_at, id) so every page is an index range scan
+    query = (
+        select(User)
+        .options(selectinload(User.providers))
+        .order_by(User.registered_at.desc(), User.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor and (position := _decode_users_cursor(cursor)):
+        query = query.where(tuple_(User.registered_at, User.id) < position)
+    if filters["is_admin"] is not None:
+        query = query.where(User.is_admin == filters["is_admin"])
+    if filters["is_banned"] is not None:
+        query = query.where(User.is_banned == filters["is_banned"])
+    if filters["is_verified"] is True:
+        query = query.where(User.providers.any(Provider.is_verified))
+    elif filters["is_verified"] is False:
+        query = query.where(~User.providers.any(Provider.is_verified))
+    if filters["provider"]:
+        query = query.where(User.providers.any(Provider.name == filters["provider"]))
+    if filters["q"]:
+        query = query.where(_user_search_condition(filters["q"]))
+
+    result = await session.execute(query)
+    users = list(result.scalars().all())
+    return users[:limit], len(users) > limit
+
+
 @router.get("/admin/users", name="auth.admin_users")
 @admin_required
 async def admin_users_view(
     request: Request,
-    user: User = Depends(current_user),
-    session: AsyncSession = Depends(get_async_session),
+    cursor: Optional[str] = None,
+    limit: int = ADMIN_USERS_PAGE_SIZE,
+    is_admin: Optional[str] = None,
+    is_banned: Optional[str] = None,
+    is_verified: Optional[str] = None,
+    provider: Optional[str] = None,
+    q: Optional[str] = None,
+    user: UserPrincipal = Depends(current_user),
+    session: AsyncSession = Depends(get_async_read_session),
 ):
     """Admin page for user management."""
-    query = (
-        select(User)
-        .options(selectinload(User.providers))
-        .order_by(User.registered_at.desc())
-    )
-    result = await session.execute(query)
-    users = result.scalars().all()
+    limit = min(max(limit, 1), ADMIN_USERS_MAX_PAGE_SIZE)
+    filters = _parse_user_filters(is_admin, is_banned, is_verified, provider, q)
+    users, has_more = await _query_admin_users(session, filters, limit, cursor)
+
+    next_page_url = None
+    if has_more:
+        next_page_url = request.url.include_query_params(
+            cursor=_encode_users_cursor(users[-1])
+        )
+    first_page_url = request.url.remove_query_params("cursor") if cursor else None
 
     # Get active invitations if registration is disabled
     invitations = []
@@ -332,7 +450,40 @@ async def admin_users_view(
     return templates.TemplateResponse(
         request,
         "auth/templates/admin_users.html",
-        {"users": users, "invitations": invitations},
+        {
+            "users": users,
+            "invitations": invitations,
+            "filters": filters,
+            "limit": limit,
+            "provider_names": [LOCAL_PROVIDER, *list_of_sso_providers.keys()],
+            "next_page_url": next_page_url,
+            "first_page_url": first_page_url,
+        },
+    )
+
+
+@router.get("/admin/users/search", name="auth.admin_users_search")
+@admin_required
+async def admin_users_search(
+    request: Request,
+    limit: int = ADMIN_USERS_PAGE_SIZE,
+    is_admin: Optional[str] = None,
+    is_banned: Optional[str] = None,
+    is_verified: Optional[str] = None,
+    provider: Optional[str] = None,
+    q: Optional[str] = None,
+    user: UserPrincipal = Depends(current_user),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    """Render only the user table, used by the live search on the admin users page."""
+    limit = min(max(limit, 1), ADMIN_USERS_MAX_PAGE_SIZE)
+    filters = _parse_user_filters(is_admin, is_banned, is_verified, provider, q)
+    users, _ = await _query_admin_users(session, filters, limit)
+
+    return templates.TemplateResponse(
+        request,
+        "auth/templates/_components/admin_user_table.html",
+        {"users": users},
     )
 
 
@@ -340,7 +491,7 @@ async def admin_users_view(
 @admin_required
 async def admin_email_view(
     request: Request,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """Admin page for user management."""
@@ -351,12 +502,65 @@ async def admin_email_view(
     )
 
 
+@router.get("/admin/stats", name="auth.admin_stats")
+@admin_required
+async def admin_stats_view(
+    request: Request,
+    user: UserPrincipal = Depends(current_user),
+    session: AsyncSession = Depends(get_async_read_session),
+):
+    """Admin page with user, provider and token totals."""
+    return templates.TemplateResponse(
+        request,
+        "auth/templates/admin_stats.html",
+        {"stats": await get_admin_stats(session)},
+    )
+
+
+@router.get("/admin/queries", name="auth.admin_queries")
+@admin_required
+async def admin_queries_view(
+    request: Request,
+    user: UserPrincipal = Depends(current_user),
+):
+    """Admin page with per statement query statistics of this worker."""
+    stats = sorted(query_stats.values(), key=lambda s: s.total_time, reverse=True)
+    return templates.TemplateResponse(
+        request,
+        "auth/templates/admin_queries.html",
+        {
+            "query_stats": stats,
+            "caches": [
+                ("Session users", user_cache.stats()),
+                ("API keys", api_key_cache.stats()),
+                ("Invalid API keys", invalid_api_key_cache.stats()),
+            ],
+            "password_hasher": password_hasher.stats(),
+        },
+    )
+
+
+@router.post("/admin/queries/reset", name="auth.reset_query_stats")
+@admin_required
+async def reset_query_stats(
+    request: Request,
+    user: UserPrincipal = Depends(current_user),
+):
+    """Clear the collected query statistics."""
+    query_stats.clear()
+    flash(request, "Query statistics reset", "success")
+    return RedirectResponse(
+        url=request.url_for("auth.admin_queries"),
+        status_code=status.HTTP_303_SEE_OTHER,
+    )
+
+
 @router.post("/admin/users/{user_id}/ban", name="auth.toggle_user_ban")
 @admin_required
 async def toggle_user_ban(
     request: Request,
     user_id: uuid.UUID,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """Toggle user ban status."""
@@ -387,6 +591,7 @@ async def toggle_user_ban(
 
     target_user.is_banned = not target_user.is_banned
     await session.commit()
+    invalidate_user(target_user.id)
 
     action = "banned" if target_user.is_banned else "unbanned"
     flash(request, f"User {action} successfully", "success")
@@ -401,7 +606,7 @@ async def toggle_user_ban(
 async def delete_invitation(
     request: Request,
     invitation_id: uuid.UUID,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """Delete an invitation."""
@@ -431,7 +636,7 @@ async def delete_invitation(
 async def delete_user(
     request: Request,
     user_id: uuid.UUID,
-    user: User = Depends(current_user),
+    user: UserPrincipal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """Delete a user."""
@@ -462,6 +667,7 @@ async def delete_user(
 
     await session.delete(target_user)
     await session.commit()
+    invalidate_user(target_user.id)
 
     flash(request, "User deleted successfully", "success")
     return RedirectResponse(
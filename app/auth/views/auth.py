@@ -4,12 +4,13 @@ from typing import Optional
 from fastapi import APIRouter, Depends, Form, HTTPException, Request, status
 from fastapi.responses import RedirectResponse
 from loguru import logger
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.auth.constants import LOCAL_PROVIDER
 from app.auth.models import Invitation, PasswordReset, Provider, User
+from app.auth.principal import UserPrincipal
 from app.auth.providers.views import providers as list_of_sso_providers
 from app.auth.serializers import (
     TokenDataSerializer,
@@ -20,6 +21,7 @@ from app.auth.utils import (
     add_user,
     authenticate_user,
     create_token,
+    has_users,
     optional_current_user,
     verify_and_get_password_hash,
 )
@@ -28,6 +30,7 @@ from app.common.exceptions import (
     AuthBannedError,
     AuthDuplicateError,
     FailedRegistrationError,
+    ServiceBusyError,
     UserNotVerifiedError,
     ValidationError,
 )
@@ -63,7 +66,7 @@ async def logout(request: Request):
 @router.get("/login", name="auth.login", summary="Login as a user")
 async def login_view(
     request: Request,
-    user: Optional[User] = Depends(optional_current_user),
+    user: Optional[UserPrincipal] = Depends(optional_current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     if user:
@@ -72,9 +75,7 @@ async def login_view(
         )
 
     # Check if there are any users
-    user_count = await session.execute(select(func.count(User.id)))
-    user_count = user_count.scalar()
-    if user_count == 0:
+    if not await has_users(session):
         # Redirect to register if no users exist
         flash(request, "Please register the first user account", "info")
         return RedirectResponse(
@@ -132,7 +133,7 @@ async def local_login(
         # Is caught and handled in the global app exception handler
         raise
 
-    except ValidationError as e:
+    except (ValidationError, ServiceBusyError) as e:
         flash(request, str(e), "error")
         return RedirectResponse(
             url=request.url_for("auth.login"),
@@ -156,7 +157,7 @@ async def local_login(
 async def register_view(
     request: Request,
     token: Optional[str] = None,
-    user: Optional[User] = Depends(optional_current_user),
+    user: Optional[UserPrincipal] = Depends(optional_current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     if user:
@@ -165,15 +166,14 @@ async def register_view(
         )
 
     # Check if there are any users
-    user_count = await session.execute(select(func.count(User.id)))
-    user_count = user_count.scalar()
+    is_first_user = not await has_users(session)
 
     # Check if registration is allowed
     registration_allowed = False
     invitation = None
     invited_email = None
 
-    if user_count == 0:
+    if is_first_user:
         # First user is always allowed to register
         registration_allowed = True
     elif not settings.DISABLE_REGISTRATION:
@@ -211,7 +211,7 @@ async def register_view(
         {
             "request": request,
             "list_of_sso_providers": list_of_sso_providers,
-            "is_first_user": user_count == 0,
+            "is_first_user": is_first_user,
             "invitation": invitation,
             "invited_email": invited_email,
         },
@@ -238,9 +238,7 @@ async def local_register(
 
     try:
         # Check if this is the first user
-        query = select(User)
-        result = await session.execute(query)
-        is_first_user = result.first() is None
+        is_first_user = not await has_users(session)
 
         # Check if registration is allowed
         registration_allowed = False
@@ -314,7 +312,12 @@ async def local_register(
             url=request.url_for("auth.login"), status_code=status.HTTP_303_SEE_OTHER
         )
 
-    except (FailedRegistrationError, AuthDuplicateError, ValidationError) as e:
+    except (
+        FailedRegistrationError,
+        AuthDuplicateError,
+        ValidationError,
+        ServiceBusyError,
+    ) as e:
         flash(request, str(e), "error")
         return RedirectResponse(
             url=request.url_for("auth.register"), status_code=status.HTTP_303_SEE_OTHER
@@ -333,7 +336,7 @@ async def local_register(
     "/forgot-password", name="auth.forgot_password", summary="Forgot password form"
 )
 async def forgot_password_view(
-    request: Request, user: Optional[User] = Depends(optional_current_user)
+    request: Request, user: Optional[UserPrincipal] = Depends(optional_current_user)
 ):
     """Display the forgot password form."""
     if user:
@@ -363,7 +366,7 @@ async def forgot_password_view(
 async def forgot_password(
     request: Request,
     email: str = Form(...),
-    user: Optional[User] = Depends(optional_current_user),
+    user: Optional[UserPrincipal] = Depends(optional_current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """Process forgot password request and send reset email."""
@@ -451,7 +454,7 @@ async def forgot_password(
 async def reset_password_view(
     request: Request,
     token: str,
-    user: Optional[User] = Depends(optional_current_user),
+    user: Optional[UserPrincipal] = Depends(optional_current_user),
     session: AsyncSession = Depends(get_async_session),
 ):
     """Display the reset password form."""
@@ -501,7 +504,7 @@ async def reset_password(
     password: str = Form(...),
     confirm_password: str = Form(...),
     session: AsyncSession = Depends(get_async_session),
-    user: Optional[User] = Depends(optional_current_user),
+    user: Optional[UserPrincipal] = Depends(optional_current_user),
 ):
     """Process password reset request."""
     if user:
@@ -565,6 +568,12 @@ async def reset_password(
         user.password = await verify_and_get_password_hash(password)
         password_reset.used_at = datetime.now(timezone.utc)
         await session.commit()
+    except ServiceBusyError as e:
+        flash(request, str(e), "error")
+        return RedirectResponse(
+            url=request.url_for("auth.reset_password", token=token),
+            status_code=status.HTTP_303_SEE_OTHER,
+        )
     except Exception:
         logger.exception("Error resetting password")
         flash(request, "Failed to reset password", "error")
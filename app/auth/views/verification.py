@@ -5,8 +5,10 @@ from loguru import logger
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.auth.cache import invalidate_user
 from app.auth.constants import LOCAL_PROVIDER
 from app.auth.models import Provider, User
+from app.auth.principal import UserPrincipal
 from app.auth.serializers import TokenDataSerializer
 from app.auth.utils import create_token, get_token_payload, optional_current_user
 from app.common.db import get_async_session
@@ -33,6 +35,7 @@ async def verify_email(
             request.url_for("auth.login"), status_code=status.HTTP_303_SEE_OTHER
         )
 
+    user_id = None
     if token_data.provider_name is not None:
         # Validating a provider email
         provider_query = select(Provider).filter(
@@ -42,6 +45,7 @@ async def verify_email(
         result = await session.execute(provider_query)
         provider = result.scalar_one()
         provider.is_verified = True
+        user_id = provider.user_id
 
     elif token_data.new_email is not None:
         new_email = token_data.new_email.lower().strip()
@@ -59,6 +63,7 @@ async def verify_email(
             )
         user.email = new_email
         user.pending_email = None
+        user_id = user.id
 
         # Check if there is a local provider that needs to get updated as well
         local_provider_query = select(Provider).filter(
@@ -79,6 +84,7 @@ async def verify_email(
             detail="An unexpected error occurred.",
         )
 
+    invalidate_user(user_id)
     flash(request, "Email has been verified", "success")
     return RedirectResponse(
         request.url_for("auth.account_settings_providers"),
@@ -95,7 +101,7 @@ async def resend_verification_email(
     request: Request,
     email: str = Form(...),
     provider_name: str = Form(...),
-    user: User = Depends(optional_current_user),
+    user: UserPrincipal = Depends(optional_current_user),
     session: AsyncSession = Depends(get_async_session),
 ) -> RedirectResponse:
     # Always say the email has been sent, even if nothing was sent
@@ -139,7 +145,7 @@ async def resend_verification_view(
     request: Request,
     provider: str,
     email: str,
-    user: User = Depends(optional_current_user),
+    user: UserPrincipal = Depends(optional_current_user),
 ):
     """
     Display the resend verification email page.
@@ -1,16 +1,85 @@
-from typing import AsyncGenerator
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from fastapi import Request
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session
 from sqlalchemy.pool import NullPool
 
+from app.common.instrumentation import instrument_engine
 from app.settings import settings
 
-async_engine = create_async_engine(
-    settings.database_url,
-    future=True,
-    echo=False,
-    poolclass=NullPool,  # Disable connection pooling to prevent stale connections
-)
+# Key in the session cookie with the time the client last committed a write
+LAST_WRITE_SESSION_KEY = "db_last_write"
+_REQUEST_INFO_KEY = "request"
+_HAS_WRITES_INFO_KEY = "has_writes"
+
+
+def _pool_options() -> Dict[str, Any]:
+    """Build the connection pool arguments for the engine from the settings"""
+    if not settings.DATABASE_POOL_ENABLED:
+        return {"poolclass": NullPool}
+
+    pool_size = settings.DATABASE_POOL_SIZE
+    max_overflow = settings.DATABASE_POOL_MAX_OVERFLOW
+
+    if settings.DATABASE_MAX_CONNECTIONS:
+        # Each worker process has its own pool, so split the budget between them
+        per_worker = max(
+            settings.DATABASE_MAX_CONNECTIONS // settings.WEB_CONCURRENCY, 1
+        )
+        pool_size = min(pool_size, per_worker)
+        max_overflow = max(min(max_overflow, per_worker - pool_size), 0)
+
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        # Test connections on checkout so ones dropped by the server get replaced
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers continue while a write is in progress
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # Safe with WAL, only the last transactions can be lost on power loss
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    # Wait for the write lock instead of failing straight away
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")  # 64MB
+    cursor.close()
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg"):
+        connect_args["prepared_statement_cache_size"] = (
+            settings.DATABASE_PREPARED_STATEMENT_CACHE_SIZE
+        )
+    engine = create_async_engine(
+        url, future=True, echo=False, connect_args=connect_args, **_pool_options()
+    )
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    instrument_engine(engine)
+    return engine
+
+
+async_engine = _create_engine(settings.database_url)
 
 async_session_maker = async_sessionmaker(
     async_engine,
@@ -20,9 +89,114 @@ async_session_maker = async_sessionmaker(
 )
 
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    session = async_session_maker()
+class ReplicaSet:
+    """Round robin over the read replicas, skipping ones that recently failed"""
+
+    def __init__(self, urls: List[str], cooldown: float):
+        self.engines = [_create_engine(url) for url in urls]
+        self.cooldown = cooldown
+        self._next = itertools.count()
+        self._down_until: Dict[AsyncEngine, float] = {}
+        for engine in self.engines:
+            event.listen(engine.sync_engine, "handle_error", self._on_error(engine))
+
+    def _on_error(self, engine: AsyncEngine):
+        def handle_error(context):
+            # Connection failures, not errors in the statements themselves
+            if context.is_disconnect or context.connection is None:
+                self.mark_down(engine)
+
+        return handle_error
+
+    def mark_down(self, engine: AsyncEngine) -> None:
+        logger.warning(
+            f"Read replica {engine.url.render_as_string()} is unavailable, "
+            f"skipping it for {self.cooldown}s"
+        )
+        self._down_until[engine] = time.monotonic() + self.cooldown
+
+    def pick(self) -> Optional[AsyncEngine]:
+        """Next healthy replica, None when there are none"""
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            engine = self.engines[next(self._next) % len(self.engines)]
+            if self._down_until.get(engine, 0) <= now:
+                return engine
+        return None
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+
+replicas = ReplicaSet(
+    settings.DATABASE_REPLICA_URLS, cooldown=settings.DATABASE_REPLICA_COOLDOWN
+)
+
+
+async def get_async_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    # The request is kept so a commit can record the write in its session cookie
+    session = async_session_maker(info={_REQUEST_INFO_KEY: request})
     try:
         yield session
     finally:
         await session.close()
+
+
+@asynccontextmanager
+async def read_session(
+    request: Optional[Request] = None,
+) -> AsyncIterator[AsyncSession]:
+    """
+    Session for read only work, served by a read replica when one is healthy.
+
+    Clients that committed a write in the last READ_YOUR_WRITES_WINDOW seconds
+    stay on the primary, so they see their change despite replication lag.
+    """
+    engine = None
+    last_write = request.session.get(LAST_WRITE_SESSION_KEY, 0) if request else 0
+    if time.time() - last_write > settings.READ_YOUR_WRITES_WINDOW:
+        engine = replicas.pick()
+
+    session = async_session_maker(bind=engine) if engine else async_session_maker()
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def get_async_read_session(
+    request: Request,
+) -> AsyncGenerator[AsyncSession, None]:
+    async with read_session(request) as session:
+        yield session
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flush_writes(session, flush_context):
+    session.info[_HAS_WRITES_INFO_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_writes(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info[_HAS_WRITES_INFO_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_last_write(session):
+    request = session.info.get(_REQUEST_INFO_KEY)
+    if session.info.pop(_HAS_WRITES_INFO_KEY, False) and request is not None:
+        request.session[LAST_WRITE_SESSION_KEY] = time.time()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_writes(session):
+    session.info.pop(_HAS_WRITES_INFO_KEY, None)
+
+
+async def close_db() -> None:
+    """Close all pooled connections, called when the app shuts down"""
+    logger.info("Closing database connections")
+    await async_engine.dispose()
+    await replicas.dispose()
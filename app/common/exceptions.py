@@ -23,3 +23,9 @@ class ValidationError(Exception):
     def __init__(self, detail: str):
         self.detail = detail
         super().__init__(detail)
+
+
+class ServiceBusyError(Exception):
+    def __init__(self, detail: str):
+        self.detail = detail
+        super().__init__(detail)
@@ -0,0 +1,233 @@
+import asyncio
+import math
+import re
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.settings import settings
+
+
+@dataclass
+class QueryStats:
+    """Statements run while handling a single request"""
+
+    route: str
+    count: int = 0
+    duration: float = 0.0  # (sec)
+    statements: Counter = field(default_factory=Counter)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements run at least `threshold` times, likely an N+1 pattern"""
+        return [
+            (statement, calls)
+            for statement, calls in self.statements.most_common()
+            if calls >= threshold
+        ]
+
+
+# SQLAlchemy runs the sync engine events in a greenlet that shares the context
+# of the awaiting task, so the events see the stats of the current request
+_request_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "request_query_stats", default=None
+)
+
+
+def start_query_stats(route: str) -> QueryStats:
+    """Start collecting the statements of the current request"""
+    stats = QueryStats(route)
+    _request_query_stats.set(stats)
+    return stats
+
+
+@dataclass
+class FingerprintStats:
+    """Totals for every run of one normalised statement"""
+
+    fingerprint: str
+    calls: int = 0
+    total_time: float = 0.0  # (sec)
+    rows: int = 0  # Written by INSERT, UPDATE and DELETE
+    # Recent durations only, enough for a stable p95 without growing forever
+    samples: Deque[float] = field(
+        default_factory=lambda: deque(maxlen=settings.QUERY_STATS_SAMPLES)
+    )
+
+    @property
+    def mean_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+    @property
+    def p95_time(self) -> float:
+        if not self.samples:
+            return 0.0
+        # Nearest rank, the smallest sample with 95% of samples at or below it
+        samples = sorted(self.samples)
+        return samples[math.ceil(len(samples) * 0.95) - 1]
+
+
+# Normalised statement -> stats, per worker process. Cursor events all run on
+# the event loop thread so the updates need no lock.
+query_stats: Dict[str, FingerprintStats] = {}
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\$\d+|%\(\w+\)s|\?|\b\d+(?:\.\d+)?\b")
+_VALUE_LISTS = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+
+
+def fingerprint(statement: str) -> str:
+    """Normalise a statement so runs with different values or IN list sizes match"""
+    statement = _LITERALS.sub("?", statement)
+    statement = _VALUE_LISTS.sub("(...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def _record_fingerprint(statement: str, duration: float, rows: int) -> None:
+    key = fingerprint(statement)
+    stats = query_stats.get(key)
+    if stats is None:
+        if len(query_stats) >= settings.QUERY_STATS_MAX_FINGERPRINTS:
+            return
+        stats = query_stats[key] = FingerprintStats(key)
+    stats.calls += 1
+    stats.total_time += duration
+    stats.rows += rows
+    stats.samples.append(duration)
+
+
+# Slow queries are explained on the engine that ran them, a replica has other
+# data, cache and load. Keyed by the sync engine the cursor events get, only
+# Postgres engines are added.
+_explain_engines: Dict[Engine, AsyncEngine] = {}
+# Fingerprints already explained, only the first slow run of each is
+_explained: Set[str] = set()
+_explain_tasks: Set[asyncio.Task] = set()
+
+
+def _redact(parameters: Any) -> Any:
+    """Replace parameter values by their type so no secrets reach the logs"""
+    if isinstance(parameters, dict):
+        return {key: _redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_redact(value) for value in parameters]
+    if parameters is None:
+        return None
+    return f"<{type(parameters).__name__}>"
+
+
+# EXPLAIN ANALYZE of these would wait on the row locks the request still holds
+_LOCKING_CLAUSE = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+)?(?:KEY\s+)?(?:UPDATE|SHARE)\b", re.I
+)
+
+
+async def _explain(
+    engine: AsyncEngine, key: str, statement: str, parameters: Any
+) -> None:
+    # A separate connection, rolled back on close since ANALYZE runs the query
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(skip_instrumentation=True)
+        result = await connection.exec_driver_sql(
+            f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters
+        )
+        plan = "\n".join(row[0] for row in result)
+    logger.bind(payload=plan).warning(f"Plan of slow query {key}")
+
+
+def _on_explain_done(task: asyncio.Task) -> None:
+    _explain_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.opt(exception=task.exception()).error("Error explaining slow query")
+
+
+def _log_slow_query(
+    engine: Engine, statement: str, parameters: Any, duration: float
+) -> None:
+    stats = _request_query_stats.get()
+    key = fingerprint(statement)
+    logger.bind(
+        payload={
+            "statement": statement,
+            "parameters": _redact(parameters),
+            "duration_ms": round(duration * 1000, 1),
+            "route": stats.route if stats else None,
+        }
+    ).warning(f"Slow query took {duration * 1000:.1f}ms")
+
+    explain_engine = _explain_engines.get(engine)
+    if (
+        settings.SLOW_QUERY_EXPLAIN
+        and explain_engine is not None
+        and statement.lstrip().upper().startswith("SELECT")
+        and not _LOCKING_CLAUSE.search(statement)
+        and key not in _explained
+        and len(_explained) < settings.QUERY_STATS_MAX_FINGERPRINTS
+    ):
+        _explained.add(key)
+        task = asyncio.get_running_loop().create_task(
+            _explain(explain_engine, key, statement, parameters)
+        )
+        _explain_tasks.add(task)
+        task.add_done_callback(_on_explain_done)
+
+
+def _rows_written(cursor, context) -> int:
+    """Rows affected by an INSERT, UPDATE or DELETE, 0 for other statements
+
+    The drivers report no count for SELECTs, asyncpg gives -1 and the rows are
+    only counted as the caller fetches them.
+    """
+    if context.isinsert or context.isupdate or context.isdelete:
+        return max(cursor.rowcount, 0)
+    return 0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context.execution_options.get("skip_instrumentation"):
+        return
+    duration = time.perf_counter() - context._query_start_time
+    if (
+        settings.SLOW_QUERY_THRESHOLD
+        and duration * 1000 >= settings.SLOW_QUERY_THRESHOLD
+    ):
+        _log_slow_query(conn.engine, statement, parameters, duration)
+    if settings.QUERY_STATS_ENABLED:
+        _record_fingerprint(statement, duration, _rows_written(cursor, context))
+
+    stats = _request_query_stats.get()
+    if stats is None:
+        return
+    stats.count += 1
+    stats.duration += duration
+    stats.statements[statement] += 1
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Record the statements run by `engine` in the stats of the current request"""
+    if engine.dialect.name == "postgresql":
+        _explain_engines[engine.sync_engine] = engine
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def report_query_stats(route: str, stats: QueryStats) -> None:
+    """Log requests that ran more statements than the budget or repeated one"""
+    if stats.count > settings.QUERY_BUDGET:
+        logger.warning(
+            f"{route} ran {stats.count} queries in {stats.duration * 1000:.1f}ms, "
+            f"over the budget of {settings.QUERY_BUDGET}"
+        )
+    for statement, calls in stats.repeated(settings.QUERY_REPEAT_THRESHOLD):
+        logger.bind(payload=statement).warning(
+            f"{route} ran the same query {calls} times, possible N+1"
+        )
@@ -0,0 +1,125 @@
+"""
+Helpers for migrations that have to run against a busy database without
+blocking it. Import them in migration scripts:
+
+    from app.common.migrations import batched_backfill, create_index_concurrently
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+import sqlalchemy as sa
+from loguru import logger
+
+from alembic import context, op
+from app.common.models import row_batch_condition
+from app.settings import settings
+
+# Arbitrary key for pg_advisory_lock, held while migrations run
+MIGRATION_LOCK_ID = 0x6D696772
+
+
+def _is_invalid_index(index_name: str) -> bool:
+    query = sa.text(
+        """
+        SELECT 1 FROM pg_index
+        JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+        WHERE pg_class.relname = :name AND NOT pg_index.indisvalid
+        """
+    )
+    return op.get_bind().execute(query, {"name": index_name}).first() is not None
+
+
+@contextmanager
+def _concurrently() -> Iterator[bool]:
+    """Run outside a transaction and without the migration lock_timeout.
+
+    CONCURRENTLY waits for the transactions older than it to finish, under
+    lock_timeout that fails on any busy database. Waiting is harmless as it
+    does not block reads or writes. Yields whether the database is Postgres.
+    """
+    with op.get_context().autocommit_block():
+        is_postgres = op.get_bind().dialect.name == "postgresql"
+        if is_postgres:
+            op.execute("SET lock_timeout = 0")
+        try:
+            yield is_postgres
+        finally:
+            if is_postgres:
+                op.execute(
+                    f"SET lock_timeout = {settings.MIGRATION_LOCK_TIMEOUT * 1000}"
+                )
+
+
+def create_index_concurrently(
+    index_name: str, table_name: str, columns: List[str], **kwargs: Any
+) -> None:
+    """Create an index without blocking writes to the table.
+
+    When CREATE INDEX CONCURRENTLY fails it leaves an invalid index behind,
+    which IF NOT EXISTS would skip on the next run, so it is dropped first.
+    Offline SQL can not check for it.
+    """
+    with _concurrently() as is_postgres:
+        if (
+            is_postgres
+            and not context.is_offline_mode()
+            and _is_invalid_index(index_name)
+        ):
+            op.drop_index(
+                index_name, table_name=table_name, postgresql_concurrently=True
+            )
+        op.create_index(
+            index_name,
+            table_name,
+            columns,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+            **kwargs,
+        )
+
+
+def drop_index_concurrently(index_name: str, table_name: str) -> None:
+    """Drop an index without blocking writes to the table"""
+    with _concurrently():
+        op.drop_index(
+            index_name,
+            table_name=table_name,
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def batched_backfill(
+    table_name: str,
+    values: Dict[str, Any],
+    condition: str,
+    batch_size: int = 1000,
+) -> int:
+    """Update the rows matching `condition` in batches of `batch_size`.
+
+    Each batch commits on its own so row locks are held briefly and the
+    backfill can be resumed if interrupted. `condition` must stop matching a
+    row once it has been updated, e.g. "new_column IS NULL", otherwise the
+    backfill never ends.
+    """
+    table = sa.table(table_name, *(sa.column(name) for name in values))
+    statement = (
+        sa.update(table)
+        .where(
+            row_batch_condition(
+                table, sa.text(condition), batch_size, op.get_bind().dialect.name
+            )
+        )
+        .values(**values)
+    )
+
+    updated = 0
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        while True:
+            rowcount = connection.execute(statement).rowcount
+            updated += rowcount
+            logger.info(f"Backfilled {updated} rows of {table_name}")
+            if rowcount < batch_size:
+                return updated
@@ -1,20 +1,69 @@
-from collections import defaultdict
+import functools
+from datetime import timezone
+from typing import Any, Dict, Iterable, List, Tuple
 
+import sqlalchemy as sa
 from sqlalchemy import inspect
 from sqlalchemy.orm import DeclarativeBase
 
 
+class TZDateTime(sa.TypeDecorator):
+    """
+    Timezone aware datetime on every backend. Postgres stores the timezone,
+    SQLite does not, so values are stored in UTC and read back as UTC.
+    """
+
+    impl = sa.DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None and value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+
+def row_batch_condition(table, condition, batch_size: int, dialect_name: str):
+    """
+    Condition matching at most `batch_size` rows of `table` that match
+    `condition`, by physical row id so the outer UPDATE or DELETE is a direct
+    row lookup (ctid on Postgres, rowid on SQLite).
+    """
+    row_id = sa.literal_column("ctid" if dialect_name == "postgresql" else "rowid")
+    batch = sa.select(row_id).select_from(table).where(condition).limit(batch_size)
+    if dialect_name == "postgresql":
+        # = ANY(ARRAY(...)) is planned as a TID scan, IN (SELECT ...) is not
+        return row_id == sa.any_(sa.func.array(batch.scalar_subquery()))
+    return row_id.in_(batch)
+
+
+@functools.cache
+def _column_keys(model: type) -> Tuple[str, ...]:
+    """Attribute keys of the mapped columns of a model, worked out once per model"""
+    return tuple(attr.key for attr in inspect(model).column_attrs)
+
+
 class Base(DeclarativeBase):
     @property
-    def as_dict(self):
-        output_dict = defaultdict(lambda: None)
-
-        mapper = inspect(self)
-        for column in mapper.attrs:
-            try:
-                output_dict[column.key] = column.value
-            except Exception:
-                # If the column is relational, and has not been loaded, it will raise an exception
-                continue
-
-        return output_dict
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Loaded column values of the object. Columns that are deferred or
+        expired are left out rather than loaded, relationships are not included.
+        """
+        # Loaded attributes live in the instance dict, reading it directly skips
+        # the attribute instrumentation
+        state = self.__dict__
+        return {key: state[key] for key in _column_keys(type(self)) if key in state}
+
+    @classmethod
+    def as_dicts(cls, objects: Iterable["Base"]) -> List[Dict[str, Any]]:
+        """`as_dict` for a list of objects of this model"""
+        keys = _column_keys(cls)
+        return [
+            {key: state[key] for key in keys if key in state}
+            for state in (obj.__dict__ for obj in objects)
+        ]
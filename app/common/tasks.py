@@ -0,0 +1,35 @@
+import asyncio
+from typing import Awaitable, Callable, List
+
+from loguru import logger
+
+_tasks: List[asyncio.Task] = []
+
+
+async def _run_periodically(
+    name: str, interval: float, func: Callable[[], Awaitable[None]]
+) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await func()
+        except Exception:
+            logger.exception(f"Error running periodic task {name}")
+
+
+def start_periodic_task(
+    name: str, interval: float, func: Callable[[], Awaitable[None]]
+) -> None:
+    """Run `func` every `interval` seconds in the background until the app shuts down"""
+    task = asyncio.get_running_loop().create_task(
+        _run_periodically(name, interval, func), name=name
+    )
+    _tasks.append(task)
+
+
+async def stop_periodic_tasks() -> None:
+    """Cancel all periodic tasks, called when the app shuts down"""
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -5,7 +5,6 @@ from fastapi import Request
 from fastapi.templating import Jinja2Templates
 from jinja2 import pass_context
 
-from app.auth.utils import AUTH_COOKIE, optional_current_user
 from app.common import utils
 from app.settings import settings
 
@@ -13,14 +12,10 @@ from app.settings import settings
 def app_context(request: Request) -> Dict[str, Any]:
     active_route = request.scope["route"].name if request.scope.get("route") else None
 
-    user = None
-    with utils.sync_await() as await_:
-        try:
-            session_token = await_(AUTH_COOKIE(request))
-            if session_token:
-                user = await_(optional_current_user(session_token))
-        except Exception:
-            pass
+    # Looked up before the route runs by the `resolve_user_middleware`
+    user = getattr(request.state, "user", None)
+    if user and user.is_banned:
+        user = None
 
     return {
         # Used on all pages
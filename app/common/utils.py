@@ -1,11 +1,7 @@
-import asyncio
-import threading
-from typing import Any, Awaitable, Dict, List, Literal, Optional, TypeVar
+from typing import Any, Dict, List, Literal
 
 from fastapi import Request
 
-T = TypeVar("T")
-
 
 def flash(
     request: Request,
@@ -60,22 +56,6 @@ def get_flashed_messages(request: Request) -> List[Dict[str, str]]:
     return messages
 
 
-class sync_await:
-    def __enter__(self) -> "sync_await":
-        self._loop = asyncio.new_event_loop()
-        self._looper = threading.Thread(target=self._loop.run_forever, daemon=True)
-        self._looper.start()
-        return self
-
-    def __call__(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
-        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
-
-    def __exit__(self, *exc_info: Any) -> None:
-        self._loop.call_soon_threadsafe(self._loop.stop)
-        self._looper.join()
-        self._loop.close()
-
-
 def get_key_from_options(my_dict: dict, key_options: List[str]) -> Any:
     for key in key_options:
         if key in my_dict:
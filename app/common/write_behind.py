@@ -0,0 +1,84 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Type
+
+from loguru import logger
+from sqlalchemy import bindparam, update
+
+from app.common.cache import TTLCache
+from app.common.db import async_session_maker
+from app.common.models import Base
+
+
+class TimestampBuffer:
+    """
+    Buffers "last seen" style timestamp updates in memory and writes them in batches.
+
+    Multiple updates to the same row are coalesced, only the newest timestamp is
+    written. A row that was recorded less than `staleness` seconds ago is skipped
+    entirely, so a busy row is written at most once per `staleness` seconds.
+
+    Args:
+        model: The model to update, rows are matched on its `id` column
+        column: The name of the timestamp column to set
+        staleness: Seconds a recorded timestamp is allowed to be out of date
+        maxsize: Max number of rows to remember for the staleness check
+    """
+
+    def __init__(
+        self,
+        model: Type[Base],
+        column: str,
+        staleness: float,
+        maxsize: int = 10_000,
+    ):
+        self.model = model
+        self.column = column
+        self._pending: Dict[Any, datetime] = {}
+        # Core statement so rows deleted in the meantime are silently skipped
+        table = model.__table__
+        self._statement = (
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .values({column: bindparam("value")})
+        )
+        self._recent: TTLCache[Any, datetime] = TTLCache(maxsize=maxsize, ttl=staleness)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, row_id: Any, value: datetime | None = None) -> None:
+        """Queue `value` (defaults to now) to be written to the row"""
+        if self._recent.get(row_id):
+            return
+
+        value = value or datetime.now(timezone.utc)
+        self._recent.set(row_id, value)
+        if row_id not in self._pending or self._pending[row_id] < value:
+            self._pending[row_id] = value
+
+    async def flush(self) -> None:
+        """Write all pending timestamps in a single batched UPDATE"""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        try:
+            async with async_session_maker() as session:
+                await session.execute(
+                    self._statement,
+                    [
+                        {"row_id": row_id, "value": value}
+                        for row_id, value in pending.items()
+                    ],
+                )
+                await session.commit()
+        except Exception:
+            # Put them back so they are retried on the next flush
+            for row_id, value in pending.items():
+                if row_id not in self._pending or self._pending[row_id] < value:
+                    self._pending[row_id] = value
+            raise
+
+        logger.debug(
+            f"Wrote {len(pending)} {self.model.__tablename__}.{self.column} updates"
+        )
@@ -0,0 +1,34 @@
+import asyncio
+from typing import Coroutine, Set
+
+from loguru import logger
+
+# Keep a reference to running tasks so they are not garbage collected mid send
+_tasks: Set[asyncio.Task] = set()
+
+
+def _on_done(task: asyncio.Task) -> None:
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.opt(exception=task.exception()).error("Error sending email")
+
+
+def dispatch_email(coro: Coroutine) -> None:
+    """Send an email in the background on the running event loop without waiting for it"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        coro.close()
+        logger.error("No running event loop, email was not sent")
+        return
+
+    task = loop.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_on_done)
+
+
+async def drain_emails(timeout: float = 10) -> None:
+    """Wait for emails that are still being sent, called when the app shuts down"""
+    if _tasks:
+        logger.info(f"Waiting for {len(_tasks)} email(s) to finish sending")
+        await asyncio.wait(_tasks, timeout=timeout)
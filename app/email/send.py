@@ -1,14 +1,18 @@
+import uuid
+from dataclasses import dataclass
+
 from humanfriendly import format_timespan
-from sqlalchemy import event, func, select
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session, object_session
 
 from app.auth.models import Provider
 from app.auth.serializers import TokenDataSerializer
 from app.auth.utils import create_token
-from app.common import utils
 from app.common.db import async_session_maker
 from app.settings import settings
 
 from .config import send_email_async
+from .dispatcher import dispatch_email
 
 
 async def send_invitation_email(
@@ -114,77 +118,99 @@ async def send_verification_email(
         )
 
 
-async def _send_verify_or_welcome_email(
-    incoming_data: Provider, is_new: bool = False
-) -> None:
+PENDING_PROVIDER_EMAILS = "pending_provider_emails"
+
+
+@dataclass(frozen=True)
+class ProviderEmail:
+    """Snapshot of a provider taken during a flush, used to send emails after commit"""
+
+    provider_id: uuid.UUID
+    user_id: uuid.UUID
+    email: str
+    name: str
+    is_verified: bool
+
+
+async def _send_verify_or_welcome_email(provider: ProviderEmail) -> None:
     """
     Based on what data changed, send the correct email to the user
 
     Args:
-        incoming_data: The provider being created/updated
-        is_new: Whether this is a new provider being created
+        provider: The provider that was created/updated
     """
-    # Get the old is_verified value for existing providers
-    previous_is_verified = None
-    if not is_new:
-        async with async_session_maker() as session:
-            query = select(Provider.is_verified).where(Provider.id == incoming_data.id)
-            result = await session.execute(query)
-            previous_is_verified = result.scalar_one_or_none()
-
-    if (
-        previous_is_verified is not None
-        and previous_is_verified == incoming_data.is_verified
-    ):
-        # Only proceed if is_verified changed
+    if not provider.is_verified:
+        # Send verification email if provider is being set to not verified
+        validation_token = await create_token(
+            TokenDataSerializer(
+                user_id=provider.user_id,
+                email=provider.email,
+                provider_name=provider.name,
+                token_type="validation",
+            )
+        )
+        await send_verification_email(
+            email=provider.email,
+            validation_token=validation_token,
+        )
         return
 
     async with async_session_maker() as session:
         # Get count of verified providers for this user
         query = select(func.count(Provider.id)).where(
-            Provider.user_id == incoming_data.user_id,
+            Provider.user_id == provider.user_id,
             Provider.is_verified,
-            Provider.id != incoming_data.id,  # Exclude current provider
+            Provider.id != provider.provider_id,  # Exclude current provider
         )
         result = await session.execute(query)
         verified_provider_count = result.scalar()
 
-        is_only_provider = verified_provider_count == 0
-
-        if not incoming_data.is_verified:
-            # Send verification email if provider is being set to not verified
-            validation_token = await create_token(
-                TokenDataSerializer(
-                    user_id=incoming_data.user_id,
-                    email=incoming_data.email,
-                    provider_name=incoming_data.name,
-                    token_type="validation",
-                )
-            )
-            await send_verification_email(
-                email=incoming_data.email,
-                validation_token=validation_token,
-            )
-        elif incoming_data.is_verified and is_only_provider:
-            # Send welcome email if this is becoming the only verified provider
-            await send_welcome_email(
-                email=incoming_data.email,
-            )
+    if verified_provider_count == 0:
+        # Send welcome email if this is becoming the only verified provider
+        await send_welcome_email(email=provider.email)
+
+
+def _queue_provider_email(target: Provider, is_new: bool = False) -> None:
+    """
+    Record a provider whose verified state changed in the session, the email
+    is sent once the transaction has been committed.
+    """
+    if not is_new:
+        history = inspect(target).attrs.is_verified.history
+        if not history.has_changes():
+            # Only proceed if is_verified changed
+            return
+        if history.deleted and history.deleted[0] == target.is_verified:
+            return
+
+    session = object_session(target)
+    session.info.setdefault(PENDING_PROVIDER_EMAILS, []).append(
+        ProviderEmail(
+            provider_id=target.id,
+            user_id=target.user_id,
+            email=target.email,
+            name=target.name,
+            is_verified=target.is_verified,
+        )
+    )
+
+
+@event.listens_for(Provider, "after_update")
+def provider_after_update(mapper, connection, target):
+    _queue_provider_email(target)
+
+
+@event.listens_for(Provider, "after_insert")
+def provider_after_insert(mapper, connection, target):
+    _queue_provider_email(target, is_new=True)
 
 
-@event.listens_for(Provider, "before_update")
-def provider_before_update(mapper, connection, target):
-    try:
-        with utils.sync_await() as await_:
-            _ = await_(_send_verify_or_welcome_email(target))
-    except Exception as exc:
-        raise exc
+@event.listens_for(Session, "after_commit")
+def send_pending_provider_emails(session):
+    for provider in session.info.pop(PENDING_PROVIDER_EMAILS, []):
+        dispatch_email(_send_verify_or_welcome_email(provider))
 
 
-@event.listens_for(Provider, "before_insert")
-def provider_before_insert(mapper, connection, target):
-    try:
-        with utils.sync_await() as await_:
-            _ = await_(_send_verify_or_welcome_email(target, is_new=True))
-    except Exception as exc:
-        raise exc
+@event.listens_for(Session, "after_rollback")
+def discard_pending_provider_emails(session):
+    session.info.pop(PENDING_PROVIDER_EMAILS, None)
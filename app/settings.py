@@ -20,12 +20,66 @@ class Settings(BaseSettings):
     DATABASE_HOST: str = "localhost"
     DATABASE_PORT: int = 5432
     DATABASE_NAME: str = "postgres"
+    # Overrides the settings above, e.g. "sqlite+aiosqlite:///./app.db" for a
+    # single node without a database server (needs the sqlite extra)
+    DATABASE_URL: Optional[str] = None
+    # Set to False to open a new connection per session (NullPool)
+    DATABASE_POOL_ENABLED: bool = True
+    DATABASE_POOL_SIZE: int = 5  # Persistent connections per worker
+    DATABASE_POOL_MAX_OVERFLOW: int = 10  # Extra connections per worker under load
+    DATABASE_POOL_TIMEOUT: int = 30  # (sec) Wait for a free connection before erroring
+    DATABASE_POOL_RECYCLE: int = 60 * 30  # (sec) Replace connections older than this
+    # Test connections on checkout so ones dropped by the server are replaced
+    DATABASE_POOL_PRE_PING: bool = True
+    # Prepared statements kept per asyncpg connection, 0 when behind pgbouncer
+    # in transaction mode
+    DATABASE_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    # Total connections allowed across all workers, split evenly between them
+    DATABASE_MAX_CONNECTIONS: Optional[int] = None
+    # Number of app worker processes, same env var uvicorn uses for --workers
+    WEB_CONCURRENCY: int = 1
+    # Read only work is spread over these, e.g. ["postgresql+asyncpg://user:pw@replica/db"]
+    DATABASE_REPLICA_URLS: List[str] = []
+    DATABASE_REPLICA_COOLDOWN: int = 30  # (sec) Skip a replica this long after it fails
+    # (sec) Clients read from the primary this long after they commit a write
+    READ_YOUR_WRITES_WINDOW: int = 5
+    # Migrations give up instead of queueing behind long running queries, which
+    # would block all other traffic on the table behind them
+    MIGRATION_LOCK_TIMEOUT: int = 5  # (sec) Wait for a table lock before failing
+    MIGRATION_STATEMENT_TIMEOUT: int = 0  # (sec) 0 for no limit
+    # Requests running more queries than this are logged
+    QUERY_BUDGET: int = 20
+    # The same query running this many times in one request is logged as N+1
+    QUERY_REPEAT_THRESHOLD: int = 5
+    # Per statement totals shown on the admin queries page
+    QUERY_STATS_ENABLED: bool = True
+    QUERY_STATS_MAX_FINGERPRINTS: int = 500  # Distinct statements tracked
+    QUERY_STATS_SAMPLES: int = 1000  # Recent durations kept per statement for p95
+    SLOW_QUERY_THRESHOLD: int = 500  # (ms) Log queries slower than this, 0 to disable
+    # Also log the EXPLAIN ANALYZE plan of the first slow run of each SELECT.
+    # ANALYZE runs the query a second time, so this is off by default.
+    SLOW_QUERY_EXPLAIN: bool = False
 
     # Authentication Settings
     SECRET_KEY: str = "SECRET"  # Should be overridden in production
     DISABLE_REGISTRATION: bool = False  # When True, prevents new user registration
     VALIDATION_LINK_EXPIRATION: int = 60 * 60  # (sec) 1 hour
     PASSWORD_RESET_LINK_EXPIRATION: int = 60 * 60  # (sec) 1 hour
+    # Authenticated users and API keys are cached in memory per worker
+    AUTH_CACHE_TTL: int = 30  # (sec) Set to 0 to disable the cache
+    AUTH_CACHE_MAX_SIZE: int = 10_000
+    AUTH_NEGATIVE_CACHE_TTL: int = 10  # (sec) How long unknown API keys are remembered
+    # Passwords are hashed on a thread pool so logins do not block other requests
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 100  # Reject logins once this many are waiting
+    # API key last_used and login last_login_at are buffered and written in batches
+    ACTIVITY_FLUSH_INTERVAL: int = 10  # (sec) How often buffered timestamps are written
+    ACTIVITY_STALENESS: int = 60  # (sec) How out of date timestamps may be
+    ADMIN_STATS_REFRESH_INTERVAL: int = 300  # (sec) How often admin stats are rebuilt
+    # Expired and used invitations and password resets are deleted in batches
+    PURGE_INTERVAL: int = 3600  # (sec) How often the purge runs
+    PURGE_BATCH_SIZE: int = 1000  # Rows deleted per transaction
+    PURGE_USED_AFTER: int = 86400  # (sec) How long used rows are kept
 
     # Cookie Settings
     COOKIE_NAME: str = "fastapi-boilerplate"
@@ -73,6 +127,8 @@ class Settings(BaseSettings):
 
     @property
     def database_url(self) -> str:
+        if self.DATABASE_URL:
+            return self.DATABASE_URL
         return f"postgresql+asyncpg://{self.DATABASE_USER}:{self.DATABASE_PASSWORD}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.DATABASE_NAME}"
 
 
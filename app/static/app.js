@@ -1,12 +1,15 @@
 import useCopyToClipboard from "./scripts/useCopyToClipboard.js";
 import useDateFormatter from "./scripts/useDateFormatter.js";
+import useLiveSearch from "./scripts/useLiveSearch.js";
 
 document.addEventListener("DOMContentLoaded", (event) => {
     // Initialize remaining modules
     const copyToClipboard = useCopyToClipboard();
     const dateFormatter = useDateFormatter();
+    const liveSearch = useLiveSearch();
 
     // Setup remaining modules
     copyToClipboard.setup();
     dateFormatter.format();
+    liveSearch.setup();
 });
@@ -0,0 +1,50 @@
+export default function useLiveSearch({ delay = 250 } = {}) {
+    function setup() {
+        document.querySelectorAll("form[data-live-search]").forEach(($form) => {
+            const $target = document.getElementById(
+                $form.getAttribute("data-live-search-target")
+            );
+
+            if ($target === null) {
+                return;
+            }
+
+            let timeout = null;
+            let controller = null;
+
+            const search = () => {
+                // Drop the response of a search the user already typed past
+                if (controller !== null) {
+                    controller.abort();
+                }
+                controller = new AbortController();
+
+                const params = new URLSearchParams(new FormData($form));
+                const url = `${$form.getAttribute("data-live-search")}?${params}`;
+
+                fetch(url, { signal: controller.signal })
+                    .then((response) => (response.ok ? response.text() : null))
+                    .then((html) => {
+                        if (html === null) {
+                            return;
+                        }
+                        $target.innerHTML = html;
+                        // Pagination links belong to the unfiltered page
+                        document
+                            .querySelectorAll("[data-live-search-hide]")
+                            .forEach((element) => (element.hidden = true));
+                    })
+                    .catch(() => {});
+            };
+
+            $form.addEventListener("input", () => {
+                clearTimeout(timeout);
+                timeout = setTimeout(search, delay);
+            });
+        });
+    }
+
+    return {
+        setup,
+    };
+}
@@ -0,0 +1,37 @@
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+
+def measure(func: Callable[[], object], iterations: int = 1000) -> List[float]:
+    """Call `func` repeatedly and return the duration of each call in ms"""
+    func()  # Warm up caches before timing
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+async def measure_async(
+    func: Callable[[], Awaitable[object]], iterations: int = 1000
+) -> List[float]:
+    """Await `func` repeatedly and return the duration of each call in ms"""
+    await func()  # Warm up caches before timing
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings: List[float]) -> None:
+    """Print the mean, p50 and p95 of a list of timings in ms"""
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{label:<40} mean={statistics.mean(timings):8.3f}ms"
+        f"  p50={statistics.median(timings):8.3f}ms  p95={p95:8.3f}ms"
+    )
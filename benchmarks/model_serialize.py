@@ -0,0 +1,60 @@
+"""
+Compare `Base.as_dict` against the old implementation, which went through
+`inspect()` for every attribute including relationships, on 10k users.
+
+    uv run python -m benchmarks.model_serialize
+"""
+
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect
+
+from app.auth.models import User
+
+from ._utils import measure, report
+
+ROWS = 10_000
+ITERATIONS = 20
+
+
+def _legacy_as_dict(obj):
+    output_dict = defaultdict(lambda: None)
+    for column in inspect(obj).attrs:
+        try:
+            output_dict[column.key] = column.value
+        except Exception:
+            continue
+    return output_dict
+
+
+def _build_users():
+    now = datetime.now(timezone.utc)
+    return [
+        User(
+            id=uuid.uuid4(),
+            email=f"user{i}@example.com",
+            display_name=f"User {i}",
+            registered_at=now,
+            is_admin=False,
+            is_banned=False,
+        )
+        for i in range(ROWS)
+    ]
+
+
+if __name__ == "__main__":
+    users = _build_users()
+    report(
+        f"legacy as_dict x{ROWS} (before)",
+        measure(lambda: [_legacy_as_dict(user) for user in users], ITERATIONS),
+    )
+    report(
+        f"as_dict x{ROWS} (after)",
+        measure(lambda: [user.as_dict for user in users], ITERATIONS),
+    )
+    report(
+        f"User.as_dicts x{ROWS} (after)",
+        measure(lambda: User.as_dicts(users), ITERATIONS),
+    )
@@ -0,0 +1,65 @@
+"""
+Compare the latency of rendering a page with the user pre-resolved on the
+request against the old context processor, which created a new event loop
+and thread to look the user up on every render.
+
+    uv run python -m benchmarks.template_render
+"""
+
+import asyncio
+import threading
+
+from starlette.requests import Request
+
+from app.app import app
+from app.common.templates import templates
+
+from ._utils import measure, report
+
+ITERATIONS = 1000
+
+
+def _build_request() -> Request:
+    return Request(
+        {
+            "type": "http",
+            "app": app,
+            "router": app.router,
+            "method": "GET",
+            "path": "/",
+            "root_path": "",
+            "scheme": "http",
+            "server": ("testserver", 80),
+            "headers": [],
+            "query_string": b"",
+            "session": {},
+            "state": {"user": None, "user_error": None},
+        }
+    )
+
+
+def _legacy_loop_roundtrip() -> None:
+    # What `utils.sync_await` did around the user lookup on every render
+    loop = asyncio.new_event_loop()
+    looper = threading.Thread(target=loop.run_forever, daemon=True)
+    looper.start()
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    looper.join()
+    loop.close()
+
+
+def render() -> None:
+    templates.TemplateResponse(_build_request(), "common/templates/index.html")
+
+
+def render_legacy() -> None:
+    _legacy_loop_roundtrip()
+    render()
+
+
+if __name__ == "__main__":
+    report(
+        "render with thread + event loop (before)", measure(render_legacy, ITERATIONS)
+    )
+    report("render with pre-resolved user (after)", measure(render, ITERATIONS))
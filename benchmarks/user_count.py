@@ -0,0 +1,65 @@
+"""
+Compare counting every user, as the login and register pages used to do on
+each load, against the existence check and cached flag that replaced it.
+
+Runs against the configured Postgres database. Users are seeded into a
+temporary copy of the user table, so no real data is touched.
+
+    uv run python -m benchmarks.user_count
+"""
+
+import asyncio
+
+from sqlalchemy import text
+
+from app.auth.cache import bootstrap_cache
+from app.auth.utils import has_users
+from app.common.db import async_engine, async_session_maker
+
+from ._utils import measure_async, report
+
+SEED_USERS = 1_000_000
+ITERATIONS = 200
+
+
+async def main() -> None:
+    async with async_session_maker() as session:
+        # Temporary tables are per connection, keep the session on one
+        await session.connection()
+        await session.execute(
+            text('CREATE TEMPORARY TABLE "user" (LIKE public."user" INCLUDING ALL)')
+        )
+        await session.execute(
+            text(
+                """
+                INSERT INTO "user" (id, email, display_name, registered_at)
+                SELECT gen_random_uuid(), 'user' || n || '@example.com',
+                       'user' || n, now() - n * interval '1 second'
+                FROM generate_series(1, :count) AS n
+                """
+            ),
+            {"count": SEED_USERS},
+        )
+        await session.execute(text('ANALYZE "user"'))
+
+        async def count_users():
+            await session.execute(text('SELECT count(id) FROM "user"'))
+
+        async def check_uncached():
+            bootstrap_cache.clear()
+            await has_users(session)
+
+        async def check_cached():
+            await has_users(session)
+
+        print(f"{SEED_USERS:,} users")
+        report("count(*)", await measure_async(count_users, ITERATIONS))
+        report("has_users (query)", await measure_async(check_uncached, ITERATIONS))
+        report("has_users (cached)", await measure_async(check_cached, ITERATIONS))
+
+        await session.rollback()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+Compare serializing a list of users to JSON one `UserSerializer` at a time
+against `serialize_users` encoded with orjson.
+
+    uv run python -m benchmarks.user_serialize
+"""
+
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+
+from app.auth.models import User
+from app.auth.serializers import UserSerializer, serialize_users
+
+from ._utils import measure, report
+
+ROWS = 10_000
+ITERATIONS = 20
+
+users_adapter = TypeAdapter(List[UserSerializer])
+
+
+def _build_users():
+    now = datetime.now(timezone.utc)
+    return [
+        User(
+            id=uuid.uuid4(),
+            email=f"user{i}@example.com",
+            display_name=f"User {i}",
+            registered_at=now,
+        )
+        for i in range(ROWS)
+    ]
+
+
+def per_user(users) -> bytes:
+    # What a list endpoint returning `[user.to_serializer() for user in users]` did
+    content = jsonable_encoder([user.to_serializer() for user in users])
+    return json.dumps(content).encode()
+
+
+def type_adapter(users) -> bytes:
+    return users_adapter.dump_json(users_adapter.validate_python(users))
+
+
+def bulk(users) -> bytes:
+    return ORJSONResponse(serialize_users(users)).body
+
+
+if __name__ == "__main__":
+    users = _build_users()
+    report(
+        f"to_serializer + json x{ROWS} (before)",
+        measure(lambda: per_user(users), ITERATIONS),
+    )
+    report(
+        f"TypeAdapter dump_json x{ROWS}",
+        measure(lambda: type_adapter(users), ITERATIONS),
+    )
+    report(
+        f"serialize_users + orjson x{ROWS} (after)",
+        measure(lambda: bulk(users), ITERATIONS),
+    )
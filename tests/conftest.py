@@ -0,0 +1,46 @@
+"""
+The tests run against a throwaway SQLite database, or the Postgres database in
+TEST_DATABASE_URL when it is set. Its tables are dropped and recreated, so never
+point it at a database whose data matters. The URL is set before the app is
+imported so its engines bind to it.
+
+    uv run --extra sqlite pytest
+    TEST_DATABASE_URL=postgresql+asyncpg://... uv run pytest
+"""
+
+import asyncio
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = (
+    os.environ.get("TEST_DATABASE_URL")
+    or f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/tests.db"
+)
+os.environ["SMTP_HOST"] = ""
+
+import pytest
+from sqlalchemy import text
+
+from app.common.db import async_engine
+from app.common.models import Base
+
+
+async def _create_tables() -> None:
+    async with async_engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            # The trigram indexes of the admin search need it
+            await connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    # Pooled connections belong to this event loop, the tests run their own
+    await async_engine.dispose()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    asyncio.run(_create_tables())
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
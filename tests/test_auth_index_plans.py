@@ -0,0 +1,312 @@
+"""
+Whether the planner serves the auth lookups from an index. The tables are
+seeded with production-like row counts, the auth pages, the admin user filters,
+the API key lookup and the token purge run while their statements are recorded,
+then each recorded statement is EXPLAINed with the planner's default settings.
+None may scan a seeded table sequentially, other than to read the first rows
+for a LIMIT.
+
+Needs Postgres, the SQLite planner says nothing about production plans.
+
+    TEST_DATABASE_URL=postgresql+asyncpg://... uv run pytest tests/test_auth_index_plans.py
+"""
+
+import asyncio
+import hashlib
+import re
+import uuid
+from typing import Any, Dict, List, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from app.app import app
+from app.auth.cache import bootstrap_cache, user_cache
+from app.auth.constants import LOCAL_PROVIDER
+from app.auth.purge import purge_expired_tokens
+from app.auth.serializers import TokenDataSerializer
+from app.auth.utils import create_token
+from app.auth.views import auth as auth_views
+from app.common.db import async_engine
+from app.settings import settings
+
+pytestmark = pytest.mark.skipif(
+    async_engine.dialect.name != "postgresql",
+    reason="needs Postgres, set TEST_DATABASE_URL",
+)
+
+USERS = 100_000
+API_KEYS = 20_000
+PASSWORD_RESETS = 50_000
+INVITATIONS = 2_000
+
+SEEDED_TABLES = ("user", "provider", "api_key", "password_reset", "invitation")
+SEQ_SCAN = re.compile(r'Seq Scan on "?(%s)"?\b' % "|".join(SEEDED_TABLES))
+
+DOMAINS = ("gmail.com", "outlook.com", "yahoo.com", "proton.me")
+
+# User n has the id md5(n) and the email _email(n), every user has a local
+# provider, verified for about four in five, every third also has GitHub. One in
+# a thousand is an admin. Addresses and names are as varied as real ones, the
+# trigram statistics of uniform ones make no search term look selective.
+SEED = [
+    """
+    INSERT INTO "user" (id, email, display_name, registered_at, is_admin, is_banned)
+    SELECT md5(n::text)::uuid,
+        substr(md5('email' || n), 1, 10) || '@'
+            || (ARRAY['gmail.com', 'outlook.com', 'yahoo.com', 'proton.me'])[n % 4 + 1],
+        initcap(substr(md5('name' || n), 1, 8)),
+        now() - n * interval '1 minute', n % 1000 = 0, n % 100 = 7
+    FROM generate_series(1, :users) AS n
+    """,
+    """
+    INSERT INTO provider (id, name, email, added_at, is_verified, user_id)
+    SELECT gen_random_uuid(), 'local', email, registered_at, id::text !~ '[0-2]$', id
+    FROM "user"
+    """,
+    """
+    INSERT INTO provider (id, name, email, added_at, is_verified, user_id)
+    SELECT gen_random_uuid(), 'github',
+        substr(md5('github' || n), 1, 10) || '@users.noreply.github.com',
+        now() - n * interval '1 minute', true, md5(n::text)::uuid
+    FROM generate_series(3, :users, 3) AS n
+    """,
+    """
+    INSERT INTO api_key (id, key, name, created_at, is_active, access_level, user_id)
+    SELECT gen_random_uuid(), 'key-' || n, 'key ' || n, now(), n % 10 <> 0,
+        'READ', md5((n * 5)::text)::uuid
+    FROM generate_series(1, :api_keys) AS n
+    """,
+    # As the hourly purge leaves them: used within the last day, a few active,
+    # about 1% expired or used long enough ago to be purged
+    """
+    INSERT INTO password_reset (id, token, user_id, created_at, expires_at, used_at)
+    SELECT gen_random_uuid(), 'reset-' || n, md5((n % :users + 1)::text)::uuid,
+        created_at, created_at + interval '1 hour',
+        CASE
+            WHEN n % 100 = 0 THEN NULL
+            WHEN n % 100 = 1 THEN now() - interval '25 hours'
+            ELSE created_at + interval '5 minutes'
+        END
+    FROM generate_series(1, :password_resets) AS n,
+        LATERAL (SELECT now() - (n % 86400) * interval '1 second') AS t(created_at)
+    """,
+    """
+    INSERT INTO invitation (id, email, token, created_at, expires_at, created_by_id,
+        used_at, email_sent)
+    SELECT gen_random_uuid(), substr(md5('invitee' || n), 1, 10) || '@example.net',
+        'invitation-' || n,
+        created_at, created_at + interval '7 days', md5('1000')::uuid,
+        CASE
+            WHEN n % 100 = 1 THEN now() - interval '25 hours'
+            WHEN n % 10 < 3 THEN NULL
+            ELSE now() - (n % 86400) * interval '1 second'
+        END,
+        true
+    FROM generate_series(1, :invitations) AS n,
+        LATERAL (
+            SELECT now() - CASE WHEN n % 100 = 0 THEN interval '8 days'
+                ELSE (n % 10080) * interval '1 minute' END
+        ) AS t(created_at)
+    """,
+]
+
+
+def _user_id(n: int) -> str:
+    return str(uuid.UUID(hashlib.md5(str(n).encode()).hexdigest()))
+
+
+def _email(n: int) -> str:
+    local = hashlib.md5(f"email{n}".encode()).hexdigest()[:10]
+    return f"{local}@{DOMAINS[n % len(DOMAINS)]}"
+
+
+# Each admin user filter on its own and together, with and without a cursor
+ADMIN_USER_FILTERS = [
+    {},
+    {"is_admin": "true"},
+    {"is_admin": "false"},
+    {"is_banned": "true"},
+    {"is_banned": "false"},
+    {"is_verified": "true"},
+    {"is_verified": "false"},
+    {"provider": "github"},
+    # A few users, a quarter of them, a third of the providers and nobody
+    {"q": _email(12)[:6]},
+    {"q": "gmail"},
+    {"q": "noreply"},
+    {"q": "nobody-matches-this"},
+    {"is_admin": "false", "is_verified": "true", "provider": LOCAL_PROVIDER},
+    {"is_banned": "false", "provider": "github", "q": "outlook"},
+]
+
+
+async def _seed() -> None:
+    async with async_engine.begin() as connection:
+        for statement in SEED:
+            await connection.execute(
+                text(statement),
+                {
+                    "users": USERS,
+                    "api_keys": API_KEYS,
+                    "password_resets": PASSWORD_RESETS,
+                    "invitations": INVITATIONS,
+                },
+            )
+    async with async_engine.connect() as connection:
+        await connection.execution_options(isolation_level="AUTOCOMMIT")
+        for table in SEEDED_TABLES:
+            await connection.execute(text(f'ANALYZE "{table}"'))
+    await async_engine.dispose()
+
+
+async def _truncate() -> None:
+    async with async_engine.begin() as connection:
+        tables = ", ".join(f'"{table}"' for table in SEEDED_TABLES)
+        await connection.execute(text(f"TRUNCATE {tables} CASCADE"))
+    await async_engine.dispose()
+
+
+async def _explain(statements: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Plan of each statement, nothing is executed"""
+    plans = []
+    async with async_engine.connect() as connection:
+        for statement, parameters in statements.items():
+            result = await connection.exec_driver_sql(
+                f"EXPLAIN {statement}", parameters
+            )
+            plans.append((statement, "\n".join(row[0] for row in result)))
+        await connection.rollback()
+    await async_engine.dispose()
+    return plans
+
+
+def _seq_scans(plan: str) -> List[str]:
+    """Sequential scans of a seeded table in `plan`
+
+    One that feeds a LIMIT without a filter, like the has_users check, stops at
+    the first rows it reads and is not counted.
+    """
+    lines = plan.splitlines()
+    scans = []
+    for i, line in enumerate(lines):
+        if not SEQ_SCAN.search(line):
+            continue
+        filtered = i + 1 < len(lines) and "Filter:" in lines[i + 1]
+        limited = i > 0 and lines[i - 1].lstrip(" ->").startswith("Limit")
+        if filtered or not limited:
+            scans.append(line.strip())
+    return scans
+
+
+@pytest.fixture
+def seeded():
+    asyncio.run(_seed())
+    yield
+    asyncio.run(_truncate())
+    user_cache.clear()
+    bootstrap_cache.clear()
+
+
+def _issue_auth_statements(client: TestClient, monkeypatch) -> None:
+    """Drive the auth pages through the paths that read the seeded tables"""
+
+    def log_in(user_id: str, email: str) -> None:
+        token = client.portal.call(
+            create_token,
+            TokenDataSerializer(
+                user_id=user_id,
+                email=email,
+                provider_name=LOCAL_PROVIDER,
+                token_type="access",
+            ),
+        )
+        client.cookies.set(settings.COOKIE_NAME, token)
+
+    # Registration, login and password reset
+    monkeypatch.setattr(settings, "DISABLE_REGISTRATION", True)
+    client.get("/register", params={"token": "invitation-404"})
+    client.post(
+        "/register",
+        data={
+            "email": "invitee404@example.net",
+            "password": "not-used",
+            "confirm_password": "not-used",
+            "token": "invitation-404",
+        },
+    )
+    monkeypatch.setattr(settings, "DISABLE_REGISTRATION", False)
+    client.post(
+        "/register",
+        data={
+            "email": _email(42),
+            "password": "Sup3r-secret-password",
+            "confirm_password": "Sup3r-secret-password",
+        },
+    )
+    client.post("/login", data={"email": _email(42), "password": "x"})
+    client.get("/reset-password/reset-404")
+    monkeypatch.setattr(auth_views, "is_smtp_configured", lambda: True)
+
+    async def send_password_reset_email(email: str, token: str) -> None:
+        pass
+
+    monkeypatch.setattr(
+        auth_views, "send_password_reset_email", send_password_reset_email
+    )
+    client.post("/forgot-password", data={"email": _email(11)})
+    verification = client.portal.call(
+        create_token,
+        TokenDataSerializer(
+            email=_email(7),
+            provider_name=LOCAL_PROVIDER,
+            token_type="validation",
+        ),
+    )
+    client.get("/verify", params={"token": verification})
+    client.get("/api/auth/users", headers={"X-API-Key": "key-404"})
+
+    # A user with a local and a GitHub provider
+    log_in(_user_id(3), _email(3))
+    for path in ("/account/profile", "/account/providers", "/account/api-keys"):
+        client.get(path)
+    client.post("/providers/github/disconnect")
+
+    # An admin
+    log_in(_user_id(1000), _email(1000))
+    monkeypatch.setattr(settings, "DISABLE_REGISTRATION", True)
+    for filters in ADMIN_USER_FILTERS:
+        page = client.get("/admin/users", params=filters)
+        assert page.status_code == 200
+        cursor = re.search(r"cursor=([\w=-]+)", page.text)
+        if cursor:
+            client.get("/admin/users", params={**filters, "cursor": cursor[1]})
+        client.get("/admin/users/search", params=filters)
+    client.cookies.clear()
+
+    client.portal.call(purge_expired_tokens)
+
+
+def test_auth_lookups_are_served_by_an_index(seeded, monkeypatch):
+    statements: Dict[str, Any] = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().startswith(
+            ("SELECT", "UPDATE", "DELETE")
+        ):
+            statements.setdefault(statement, parameters)
+
+    with TestClient(app, follow_redirects=False) as client:
+        event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+        try:
+            _issue_auth_statements(client, monkeypatch)
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    plans = asyncio.run(_explain(statements))
+    assert len(plans) > 20
+    seq_scans = [
+        f"{statement}\n{plan}" for statement, plan in plans if _seq_scans(plan)
+    ]
+    assert not seq_scans, "\n\n".join(seq_scans)
@@ -0,0 +1,116 @@
+"""
+How many queries resolving the session user costs. However many dependencies
+ask for the user, a request looks it up once, with a single statement for the
+user and their providers. A malformed token costs none.
+"""
+
+import pytest
+from fastapi import HTTPException, status
+from starlette.requests import Request
+
+from app.app import app
+from app.auth.cache import user_cache
+from app.auth.constants import LOCAL_PROVIDER
+from app.auth.models import Provider, User
+from app.auth.serializers import TokenDataSerializer
+from app.auth.utils import (
+    create_token,
+    current_user,
+    optional_current_user,
+    resolve_request_user,
+)
+from app.common.db import async_engine, async_session_maker
+from app.common.instrumentation import start_query_stats
+from app.email.dispatcher import drain_emails
+from app.settings import settings
+
+pytestmark = pytest.mark.anyio
+
+EMAIL = "query-count@example.com"
+
+
+def _build_request(token: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "app": app,
+            "method": "GET",
+            "path": "/",
+            "headers": [(b"cookie", f"{settings.COOKIE_NAME}={token}".encode())],
+            "query_string": b"",
+            "session": {},
+            "state": {},
+        }
+    )
+
+
+@pytest.fixture
+async def token():
+    """Session token of a user with a local provider"""
+    async with async_session_maker() as session:
+        user = User(email=EMAIL, display_name="query-count")
+        session.add(
+            Provider(name=LOCAL_PROVIDER, email=EMAIL, user=user, is_verified=True)
+        )
+        await session.commit()
+    # The welcome email for the new provider is sent in the background
+    await drain_emails()
+
+    yield await create_token(
+        TokenDataSerializer(
+            user_id=user.id,
+            email=EMAIL,
+            provider_name=LOCAL_PROVIDER,
+            token_type="access",
+        )
+    )
+
+    async with async_session_maker() as session:
+        await session.delete(await session.get(User, user.id))
+        await session.commit()
+    user_cache.clear()
+    await async_engine.dispose()
+
+
+async def test_request_looks_up_the_user_once(token):
+    user_cache.clear()
+    request = _build_request(token)
+    stats = start_query_stats("test")
+
+    # The middleware, a route dependency and the template context all ask
+    await resolve_request_user(request)
+    await current_user(request)
+    await optional_current_user(request)
+
+    assert stats.count == 1
+
+
+@pytest.mark.parametrize("dependency", [current_user, optional_current_user])
+async def test_dependency_loads_user_and_providers_in_one_query(token, dependency):
+    user_cache.clear()
+    stats = start_query_stats("test")
+
+    user = await dependency(_build_request(token))
+
+    assert stats.count == 1
+    assert [provider.name for provider in user.providers] == [LOCAL_PROVIDER]
+
+
+async def test_malformed_token_is_rejected_without_a_lookup(token):
+    # Signed by us, but the user id is not a UUID
+    malformed = await create_token(
+        TokenDataSerializer(
+            user_id="not-a-uuid",
+            email=EMAIL,
+            provider_name=LOCAL_PROVIDER,
+            token_type="access",
+        )
+    )
+    stats = start_query_stats("test")
+
+    assert await optional_current_user(_build_request(malformed)) is None
+    with pytest.raises(HTTPException) as exc_info:
+        await current_user(_build_request(malformed))
+
+    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+    assert stats.count == 0